@@ -0,0 +1,139 @@
+"""
+The asyncio compression module
+
+Setting compressor.data blocks for as long as the compression takes,
+which is way too long for an event loop. AsyncCompressor cuts the stream
+into chunks, compresses them in an executor and writes them out in order,
+never keeping more than max_in_flight chunks around at once.
+
+Every chunk is written as a 4 byte little-endian length and the
+serialized codec output, see serialization.py.
+"""
+import asyncio
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Executor
+
+from serialization import CODECS, MAX_OUTPUT, compress, decompress
+
+_HEADER_LEN = 4
+
+
+async def _read_chunk(reader: asyncio.StreamReader, size: int) -> bytes:
+    """Read size bytes, or whatever is left before EOF"""
+    try:
+        return await reader.readexactly(size)
+    except asyncio.IncompleteReadError as err:
+        return err.partial
+
+
+class AsyncCompressor:
+    """
+    The asyncio wrapper for the compressors
+
+    Methods:
+        compress(reader, writer): compress everything from reader into writer
+        decompress(reader, writer): undo compress
+    """
+
+    def __init__(
+        self,
+        codec: str = "deflate",
+        chunk_size: int = 1 << 16,
+        max_in_flight: int = 4,
+        executor: Executor | None = None,
+    ):
+        """
+        Init for the AsyncCompressor
+
+        Args:
+            codec: str - one of serialization.CODECS
+            chunk_size: int - the size of the chunks the input is cut into
+            max_in_flight: int - how many chunks can be compressed at once,
+                the reader is not read from until one of them is written
+            executor: Executor - where to compress, the loop's default
+                thread pool if None. Pass a ProcessPoolExecutor to use
+                more than one core, but make it with a "forkserver" or
+                "spawn" context (or before any connections are open),
+                or the forked workers keep the sockets from closing
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec!r}")
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self._codec = codec
+        self._chunk_size = chunk_size
+        self._max_in_flight = max_in_flight
+        self._executor = executor
+
+    async def _pipe(
+        self,
+        read: Callable,
+        process: Callable,
+        write: Callable[[bytes], None],
+        writer: asyncio.StreamWriter,
+    ):
+        """
+        Run process on everything read in the executor and write the
+        results in order, with at most max_in_flight of them pending
+        """
+        loop = asyncio.get_running_loop()
+        in_flight: deque[asyncio.Future] = deque()
+        try:
+            while item := await read():
+                in_flight.append(
+                    loop.run_in_executor(self._executor, *process(item))
+                )
+                if len(in_flight) >= self._max_in_flight:
+                    write(await in_flight.popleft())
+                    await writer.drain()
+            while in_flight:
+                write(await in_flight.popleft())
+                await writer.drain()
+        finally:
+            # On an error, don't leave the other jobs running or unretrieved
+            for future in in_flight:
+                future.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+    async def compress(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        """
+        Compress everything from the reader into the writer
+        """
+
+        def write(frame: bytes):
+            writer.write(len(frame).to_bytes(_HEADER_LEN, "little") + frame)
+
+        await self._pipe(
+            lambda: _read_chunk(reader, self._chunk_size),
+            lambda chunk: (compress, self._codec, chunk),
+            write,
+            writer,
+        )
+
+    async def decompress(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        """
+        Decompress everything from the reader into the writer
+        """
+
+        async def read() -> bytes:
+            header = await _read_chunk(reader, _HEADER_LEN)
+            if not header:
+                return b""
+            if len(header) < _HEADER_LEN:
+                raise ValueError("Truncated frame header")
+            size = int.from_bytes(header, "little")
+            if size > MAX_OUTPUT:
+                raise ValueError(f"Frame of {size} bytes is too large")
+            return await reader.readexactly(size)
+
+        await self._pipe(
+            read,
+            lambda frame: (decompress, frame),
+            writer.write,
+            writer,
+        )
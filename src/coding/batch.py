@@ -0,0 +1,377 @@
+"""
+The batch compression module
+
+Compressing lots of small messages one by one is mostly spent on making the
+encoders, the LZW tables and the Huffmann alphabets. These functions do the
+setup once per batch, can share one entropy coder alphabet between all the
+messages and can spread big batches over an executor the caller keeps around.
+
+Every message is stored in the serialization.py formats, behind a byte that
+says whether it was a str (compressed as utf-8) or bytes.
+"""
+from collections import Counter
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import Executor
+from itertools import accumulate
+from typing import Any
+
+import serialization
+from huffmann import HuffmannEncoder
+from lz77 import LZ77Decoder, LZ77Encoder
+from lzw import LZWDecoder, LZWEncoder
+from serialization import MAX_OUTPUT, Reader, varint
+from tans import TANSDecoder, TANSEncoder
+
+CODECS = ("lz77", "lzw", "deflate")
+BACKENDS = ("huffmann", "tans")
+
+# Smaller batches aren't worth sending to other processes
+MIN_PARALLEL_SIZE = 1 << 16
+# The rough total size of the messages in one executor job
+_JOB_SIZE = 1 << 14
+
+
+class CompressedBatch:
+    """
+    The result of compress_many
+
+    All the messages are stored in one buffer, message i is
+    buffer[offsets[i] : offsets[i + 1]].
+
+    Attributes:
+        codec: str - the codec name
+        options: dict - the codec options
+        buffer: bytes - the compressed messages, one after another
+        offsets: list[int] - the message offsets into the buffer
+        alphabet: Any - the shared entropy coder alphabet, if there is one
+
+    Methods:
+        to_bytes() -> bytes: serialize the batch
+        from_bytes(data) -> CompressedBatch: undo to_bytes
+    """
+
+    def __init__(
+        self,
+        codec: str,
+        options: dict[str, Any],
+        blobs: list[bytes],
+        alphabet: Any = None,
+    ):
+        """
+        Init for the batch
+        """
+        self.codec = codec
+        self.options = options
+        self.buffer = b"".join(blobs)
+        self.offsets = [0] + list(accumulate(map(len, blobs)))
+        self.alphabet = alphabet
+
+    def __len__(self) -> int:
+        """The number of messages"""
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> memoryview:
+        """Get the compressed message"""
+        if idx < 0:
+            idx += len(self)
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return memoryview(self.buffer)[start:end]
+
+    def __iter__(self) -> Iterator[memoryview]:
+        """Iterate over the compressed messages"""
+        return (self[idx] for idx in range(len(self)))
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the batch:
+            codec | backend | buf_size | has alphabet | alphabet
+            | count | size * count | buffer
+        """
+        backend = self.options["backend"]
+        out = bytearray([CODECS.index(self.codec), BACKENDS.index(backend)])
+        out += varint(self.options["buf_size"])
+        out.append(self.alphabet is not None)
+        if self.alphabet is not None and backend == "huffmann":
+            serialization.write_huffmann_alphabet(out, self.alphabet)
+        elif self.alphabet is not None:
+            serialization.write_tans_alphabet(out, self.alphabet)
+        out += varint(len(self))
+        offsets = self.offsets
+        serialization.write_varints(
+            out, [end - start for start, end in zip(offsets, offsets[1:])]
+        )
+        return bytes(out + self.buffer)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CompressedBatch":
+        """
+        Read the batch written by to_bytes
+
+        Raises:
+            ValueError - if the data is malformed
+        """
+        reader = Reader(data)
+        codec = reader.count(len(CODECS) - 1)
+        backend = BACKENDS[reader.count(len(BACKENDS) - 1)]
+        options = {"buf_size": reader.varint(), "backend": backend}
+        alphabet = None
+        if reader.count(1):
+            if CODECS[codec] != "deflate":
+                raise ValueError(f"{CODECS[codec]} has no alphabet")
+            if backend == "huffmann":
+                alphabet = {
+                    code.encode("utf-8"): symbol
+                    for code, symbol in serialization.read_huffmann_alphabet(
+                        reader
+                    ).items()
+                }
+            else:
+                alphabet = serialization.read_tans_alphabet(reader)
+        sizes = reader.varints(reader.count(reader.left()))
+        if sum(sizes) != reader.left():
+            raise ValueError("The message sizes don't add up to the buffer")
+        batch = cls(CODECS[codec], options, [], alphabet)
+        batch.buffer = reader.read(reader.left())
+        batch.offsets = [0] + list(accumulate(sizes))
+        return batch
+
+
+def _to_bytes(message: str | bytes) -> tuple[bool, bytes]:
+    """Get whether the message is a str, and its bytes"""
+    if isinstance(message, str):
+        return True, message.encode("utf-8")
+    return False, bytes(message)
+
+
+def _tokens_chunk(buf_size: int, messages: list) -> list[tuple[bool, list]]:
+    """Get the lz77 tokens for every message, with one encoder"""
+    encoder = LZ77Encoder(buf_size)
+    result = []
+    for message in messages:
+        is_str, data = _to_bytes(message)
+        result.append((is_str, encoder.encode(data)))
+    return result
+
+
+def _lz77_chunk(buf_size: int, messages: list) -> list[bytes]:
+    """Compress the messages with lz77"""
+    result = []
+    for is_str, tokens in _tokens_chunk(buf_size, messages):
+        out = bytearray([is_str])
+        serialization.write_tokens(out, tokens)
+        result.append(bytes(out))
+    return result
+
+
+def _lzw_chunk(messages: list) -> list[bytes]:
+    """Compress the messages with LZW, with one encoder"""
+    encoder = LZWEncoder()
+    result = []
+    for message in messages:
+        is_str, data = _to_bytes(message)
+        out = bytearray([is_str])
+        serialization.write_codes(out, encoder.encode(data.decode("latin-1")))
+        result.append(bytes(out))
+    return result
+
+
+def _entropy_chunk(
+    backend: str, alphabet: Any, streams: list[tuple[bool, list]]
+) -> list[bytes]:
+    """
+    Entropy code the lz77 tokens with one encoder, storing the alphabet
+    with every message unless there's a shared one
+    """
+    encoder = HuffmannEncoder() if backend == "huffmann" else TANSEncoder()
+    result = []
+    for is_str, tokens in streams:
+        code = encoder.encode(tokens, alphabet)
+        out = bytearray([is_str])
+        if backend == "huffmann":
+            if alphabet is None:
+                serialization.write_huffmann_alphabet(out, encoder.alphabet)
+            serialization.write_huffmann_code(out, code)
+        else:
+            if alphabet is None:
+                serialization.write_tans_alphabet(out, encoder.alphabet)
+            serialization.write_tans_code(out, code)
+        result.append(bytes(out))
+    return result
+
+
+def _deflate_chunk(buf_size: int, backend: str, messages: list) -> list[bytes]:
+    """
+    Compress the messages with deflate, each with its own alphabet, so
+    that the tokens never leave the worker
+    """
+    return _entropy_chunk(backend, None, _tokens_chunk(buf_size, messages))
+
+
+def _decode_chunk(
+    codec: str, backend: str, alphabet: Any, blobs: list[bytes]
+) -> list[str | bytes]:
+    """Decode the compressed messages"""
+    # Invert the shared huffmann alphabet only once
+    if backend == "huffmann" and alphabet is not None:
+        alphabet = {
+            code.decode("utf-8"): symbol for code, symbol in alphabet.items()
+        }
+    lzw_decoder = LZWDecoder()
+    tans_decoder = TANSDecoder()
+    result = []
+    for blob in blobs:
+        reader = Reader(blob)
+        try:
+            is_str = reader.count(1)
+            if codec == "lzw":
+                data = lzw_decoder.decode(
+                    serialization.read_codes(reader, MAX_OUTPUT)
+                ).encode("latin-1")
+            else:
+                if codec == "lz77":
+                    tokens = serialization.read_tokens(reader, MAX_OUTPUT)
+                elif backend == "huffmann":
+                    codes = alphabet
+                    if codes is None:
+                        codes = serialization.read_huffmann_alphabet(reader)
+                    tokens = serialization.read_huffmann_code(reader, codes)
+                else:
+                    frequencies = alphabet
+                    if frequencies is None:
+                        frequencies = serialization.read_tans_alphabet(reader)
+                    tokens = serialization.read_tans_code(
+                        reader, frequencies, MAX_OUTPUT, tans_decoder
+                    )
+                serialization.check_tokens(tokens, MAX_OUTPUT)
+                data = bytes(LZ77Decoder.decode(tokens))
+            reader.finish()
+        except (IndexError, KeyError, TypeError, OverflowError) as err:
+            raise ValueError(f"Malformed message: {err!r}") from err
+        result.append(data.decode("utf-8") if is_str else data)
+    return result
+
+
+def _item_size(item: Any) -> int:
+    """The size of a message, a (is_str, tokens) stream or a blob"""
+    return len(item[1]) if isinstance(item, tuple) else len(item)
+
+
+def _map(
+    func: Callable[..., list],
+    items: list,
+    executor: Executor | None,
+    *args: Any,
+) -> list:
+    """
+    Run func(*args, chunk) over the chunks of items, in the executor if
+    there is one and the items are big enough, and put the results back
+    together in order
+    """
+    sizes = [_item_size(item) for item in items]
+    if executor is None or sum(sizes) < MIN_PARALLEL_SIZE:
+        return func(*args, items)
+    chunks = []
+    start = 0
+    total = 0
+    for idx, size in enumerate(sizes):
+        total += size
+        if total >= _JOB_SIZE:
+            chunks.append(items[start : idx + 1])
+            start = idx + 1
+            total = 0
+    if start < len(items):
+        chunks.append(items[start:])
+    futures = [executor.submit(func, *args, chunk) for chunk in chunks]
+    result = []
+    for future in futures:
+        result.extend(future.result())
+    return result
+
+
+def compress_many(
+    messages: Sequence[str | bytes],
+    codec: str = "deflate",
+    buf_size: int = 128,
+    backend: str = "huffmann",
+    shared_alphabet: bool = False,
+    executor: Executor | None = None,
+) -> CompressedBatch:
+    """
+    Compress many messages at once
+
+    Args:
+        messages: Sequence[str | bytes] - the messages
+        codec: str - "lz77", "lzw" or "deflate"
+        buf_size: int - the lz77 buffer size
+        backend: str - the deflate entropy coder, "huffmann" or "tans"
+        shared_alphabet: bool - use one entropy coder alphabet for the
+            whole batch, instead of storing one per message. For messages
+            under a few KB the alphabet is bigger than the code itself
+        executor: Executor - e.g. a long-lived ProcessPoolExecutor to
+            spread the work over, None to stay in this process. Batches
+            under MIN_PARALLEL_SIZE stay in this process anyway
+
+    Returns:
+        CompressedBatch - the compressed messages, in the same order
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec {codec!r}, expected one of {CODECS}")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}")
+    messages = list(messages)
+    options = {"buf_size": buf_size, "backend": backend}
+
+    if codec == "lzw":
+        blobs = _map(_lzw_chunk, messages, executor)
+        return CompressedBatch(codec, options, blobs)
+    if codec == "lz77":
+        blobs = _map(_lz77_chunk, messages, executor, buf_size)
+        return CompressedBatch(codec, options, blobs)
+    if not shared_alphabet:
+        blobs = _map(_deflate_chunk, messages, executor, buf_size, backend)
+        return CompressedBatch(codec, options, blobs)
+
+    # The alphabet needs all the tokens, so this takes two passes
+    streams = _map(_tokens_chunk, messages, executor, buf_size)
+    counter = Counter()
+    for _, tokens in streams:
+        counter.update(tokens)
+    alphabet = None
+    if backend == "huffmann":
+        alphabet = {
+            code.encode("utf-8"): symbol
+            for symbol, code in HuffmannEncoder.make_alphabet(counter).items()
+        }
+    elif counter:
+        alphabet = TANSEncoder.normalise(
+            counter, TANSEncoder.choose_table_log(len(counter))
+        )
+    blobs = _map(_entropy_chunk, streams, executor, backend, alphabet)
+    return CompressedBatch(codec, options, blobs, alphabet)
+
+
+def decompress_many(
+    batch: CompressedBatch, executor: Executor | None = None
+) -> list[str | bytes]:
+    """
+    Decompress all the messages in the batch
+
+    Args:
+        batch: CompressedBatch - the output of compress_many
+        executor: Executor - where to spread the work,
+            None to stay in this process
+
+    Returns:
+        list[str | bytes] - the messages, in the same order
+
+    Raises:
+        ValueError - if a message is malformed
+    """
+    return _map(
+        _decode_chunk,
+        [bytes(blob) for blob in batch],
+        executor,
+        batch.codec,
+        batch.options["backend"],
+        batch.alphabet,
+    )
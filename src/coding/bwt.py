@@ -0,0 +1,324 @@
+"""
+The BWT (Burrows-Wheeler transform) encoder/decoder module
+
+It's the bzip2 pipeline: the data is split into blocks, each block is
+BWT-ed with a suffix array (built with SA-IS, so in linear time),
+then goes through move-to-front, the zero runs get squashed
+and whatever is left is Huffmann-coded.
+"""
+from collections.abc import Sequence
+from typing import Any
+
+from base_encoder import BaseCompressor, BaseDecoder, BaseEncoder
+from huffmann import HuffmannDecoder, HuffmannEncoder
+
+# A BWT block: the primary index, the huffmann code and its alphabet
+Block = tuple[int, list[tuple[int, int]], dict[bytes, Any]]
+
+# The zero run symbols, the same as in bzip2.
+# The MTF indices >= 1 are shifted up by one to make space for them
+RUNA = 0
+RUNB = 1
+END_OF_BLOCK = 257
+
+
+def suffix_array(text: list[int], alphabet_size: int) -> list[int]:
+    """
+    Build the suffix array with SA-IS
+
+    Args:
+        text: list[int] - the text, it must end with a unique 0
+        alphabet_size: int - all symbols must be less than this
+
+    Returns:
+        list[int] - the suffix array
+    """
+    size = len(text)
+    if size == 1:
+        return [0]
+
+    # True for S-type suffixes, False for L-type ones
+    is_s = [False] * size
+    is_s[-1] = True
+    for i in range(size - 2, -1, -1):
+        is_s[i] = text[i] < text[i + 1] or (
+            text[i] == text[i + 1] and is_s[i + 1]
+        )
+    is_lms = [False] + [is_s[i] and not is_s[i - 1] for i in range(1, size)]
+
+    counts = [0] * alphabet_size
+    for symbol in text:
+        counts[symbol] += 1
+    bucket_heads = [0] * alphabet_size
+    bucket_tails = [0] * alphabet_size
+    total = 0
+    for symbol, count in enumerate(counts):
+        bucket_heads[symbol] = total
+        total += count
+        bucket_tails[symbol] = total - 1
+
+    def induce(lms_order: list[int]) -> list[int]:
+        """Induce the order of all suffixes from the LMS ones"""
+        result = [-1] * size
+        tails = bucket_tails[:]
+        for i in reversed(lms_order):
+            result[tails[text[i]]] = i
+            tails[text[i]] -= 1
+        heads = bucket_heads[:]
+        for k in range(size):
+            j = result[k] - 1
+            if j >= 0 and not is_s[j]:
+                result[heads[text[j]]] = j
+                heads[text[j]] += 1
+        tails = bucket_tails[:]
+        for k in range(size - 1, -1, -1):
+            j = result[k] - 1
+            if j >= 0 and is_s[j]:
+                result[tails[text[j]]] = j
+                tails[text[j]] -= 1
+        return result
+
+    def lms_equal(first: int, second: int) -> bool:
+        """Check if the LMS substrings at the positions are equal"""
+        if first == size - 1 or second == size - 1:
+            return False
+        k = 0
+        while True:
+            if (
+                text[first + k] != text[second + k]
+                or is_s[first + k] != is_s[second + k]
+            ):
+                return False
+            if k > 0 and (is_lms[first + k] or is_lms[second + k]):
+                return is_lms[first + k] and is_lms[second + k]
+            k += 1
+
+    lms = [i for i in range(size) if is_lms[i]]
+    names = [-1] * size
+    name = 0
+    prev = -1
+    for i in induce(lms):
+        if not is_lms[i]:
+            continue
+        if prev >= 0 and not lms_equal(prev, i):
+            name += 1
+        names[i] = name
+        prev = i
+
+    reduced = [names[i] for i in lms]
+    if name + 1 == len(lms):
+        reduced_sa = [0] * len(lms)
+        for i, symbol in enumerate(reduced):
+            reduced_sa[symbol] = i
+    else:
+        reduced_sa = suffix_array(reduced, name + 1)
+    return induce([lms[i] for i in reduced_sa])
+
+
+class BWTEncoder(BaseEncoder):
+    """
+    The BWT encoder class
+
+    Methods:
+        encode(stream: str | bytes) -> list: encodes the stream block by block
+    """
+
+    def __init__(self, block_size: int = 100_000):
+        """
+        Init for the BWT encoder
+
+        Args:
+            block_size: int - the block size in bytes.
+                The memory used is linear in it
+        """
+        self._block_size = block_size
+        self._huffmann = HuffmannEncoder()
+
+    @staticmethod
+    def transform(block: bytes) -> tuple[int, bytes]:
+        """
+        Do the BWT on the block
+
+        Returns:
+            tuple[int, bytes] - the primary index and the last column
+        """
+        text = [byte + 1 for byte in block] + [0]
+        last_column = bytearray()
+        primary = 0
+        for i, suffix in enumerate(suffix_array(text, 257)):
+            if suffix == 0:
+                primary = i
+            else:
+                last_column.append(text[suffix - 1] - 1)
+        return primary, bytes(last_column)
+
+    @staticmethod
+    def move_to_front(block: bytes) -> list[int]:
+        """
+        Do the move-to-front and zero run coding
+        """
+        order = list(range(256))
+        result = []
+        run = 0
+        for byte in block:
+            idx = order.index(byte)
+            if idx == 0:
+                run += 1
+                continue
+            while run:
+                if run & 1:
+                    result.append(RUNA)
+                    run = (run - 1) >> 1
+                else:
+                    result.append(RUNB)
+                    run = (run - 2) >> 1
+            del order[idx]
+            order.insert(0, byte)
+            result.append(idx + 1)
+        while run:
+            if run & 1:
+                result.append(RUNA)
+                run = (run - 1) >> 1
+            else:
+                result.append(RUNB)
+                run = (run - 2) >> 1
+        result.append(END_OF_BLOCK)
+        return result
+
+    def encode(self, stream: str | bytes) -> list[Block]:
+        """
+        Encode the given stream
+
+        Args:
+            stream: str | bytes - the data, strings are utf-8 encoded
+
+        Returns:
+            list[Block] - a (primary index, huffmann code, huffmann alphabet)
+                tuple for every block
+        """
+        if isinstance(stream, str):
+            stream = stream.encode("utf-8")
+        result = []
+        for start in range(0, len(stream), self._block_size):
+            primary, last_column = self.transform(
+                stream[start : start + self._block_size]
+            )
+            code = self._huffmann.encode(self.move_to_front(last_column))
+            result.append((primary, code, self._huffmann.alphabet))
+        return result
+
+
+class BWTDecoder(BaseDecoder):
+    """
+    The BWT decoder class
+
+    Methods:
+        decode(encoded_stream: list) -> bytes: decode the BWT code
+    """
+
+    def __init__(self):
+        """Init for the decoder"""
+        self._huffmann = HuffmannDecoder()
+
+    @staticmethod
+    def move_to_front(symbols: list[int]) -> bytes:
+        """
+        Undo the zero run and move-to-front coding
+        """
+        order = list(range(256))
+        result = bytearray()
+        run = 0
+        power = 1
+        for symbol in symbols:
+            if symbol <= RUNB:
+                run += power << symbol
+                power <<= 1
+                continue
+            if run:
+                result.extend(order[0:1] * run)
+                run = 0
+                power = 1
+            if symbol == END_OF_BLOCK:
+                break
+            byte = order.pop(symbol - 1)
+            order.insert(0, byte)
+            result.append(byte)
+        return bytes(result)
+
+    @staticmethod
+    def inverse_transform(primary: int, last_column: bytes) -> bytes:
+        """
+        Undo the BWT
+        """
+        column = [byte + 1 for byte in last_column]
+        column.insert(primary, 0)
+        counts = [0] * 257
+        ranks = []
+        for symbol in column:
+            ranks.append(counts[symbol])
+            counts[symbol] += 1
+        starts = [0] * 257
+        total = 0
+        for symbol, count in enumerate(counts):
+            starts[symbol] = total
+            total += count
+
+        result = bytearray(len(last_column))
+        row = 0
+        for i in range(len(last_column) - 1, -1, -1):
+            symbol = column[row]
+            result[i] = symbol - 1
+            row = starts[symbol] + ranks[row]
+        return bytes(result)
+
+    def decode(self, encoded_stream: list[Block]) -> bytes:
+        """
+        Decode the BWT code
+        """
+        result = bytearray()
+        for primary, code, alphabet in encoded_stream:
+            symbols = self._huffmann.decode(
+                ["0" * x[0] + bin(x[1])[2:] for x in code], alphabet
+            )
+            result += self.inverse_transform(
+                primary, self.move_to_front(symbols)
+            )
+        return bytes(result)
+
+
+class BWTCompressor(BaseCompressor):
+    """
+    The BWT compressor
+
+    Attributes:
+        data - the data thet the compress stores.
+            It is stored compressed and it is decoded on using the property
+    """
+
+    def __init__(self, block_size: int = 100_000):
+        """
+        Init method for the BWTCompressor
+        """
+        self._encoder = BWTEncoder(block_size)
+        self._decoder = BWTDecoder()
+        self._data = []
+        self._is_str = False
+
+    @property
+    def data(self) -> str | bytes:
+        """
+        Getter for the stored data
+
+        Returns:
+            str | bytes - the decoded data, of the same type it was given
+        """
+        result = self._decoder.decode(self._data)
+        return result.decode("utf-8") if self._is_str else result
+
+    @data.setter
+    def data(self, data: str | bytes):
+        """
+        Setter for the stored data
+        """
+        self._is_str = isinstance(data, str)
+        self._data = self._encoder.encode(data)
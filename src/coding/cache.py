@@ -0,0 +1,276 @@
+"""
+The compression cache module
+
+A lot of payloads are byte-for-byte repeats, and there's no point in
+compressing them again. CachedCompressor looks the payload up by its hash
+(and the codec name) first and only compresses it on a miss.
+The cache lives in memory (MemoryCache) or in a sqlite file (SQLiteCache),
+both are LRU and bounded by the total size of the stored values.
+The values are serialization.py blobs, so whoever can write the sqlite file
+can't make the processes that read it run anything.
+"""
+import hashlib
+import sqlite3
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import serialization
+from base_encoder import BaseCompressor
+
+
+class BaseCache(ABC):
+    """
+    The cache abstract base class
+
+    Attributes:
+        hits: int - the number of found keys
+        misses: int - the number of missing keys
+        max_bytes: int - the maximal total size of the values
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Init for the cache
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    @abstractmethod
+    def size(self) -> int:
+        """
+        The total size of the stored values
+        """
+        ...
+
+    @abstractmethod
+    def _get(self, key: bytes) -> bytes | None:
+        """
+        Get the value and mark it as recently used
+        """
+        ...
+
+    @abstractmethod
+    def put(self, key: bytes, value: bytes):
+        """
+        Store the value, evicting the least recently used ones if needed
+        """
+        ...
+
+    def get(self, key: bytes) -> bytes | None:
+        """
+        Get the value for the key, None if there isn't one
+        """
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+
+class MemoryCache(BaseCache):
+    """
+    The in-process LRU cache
+    """
+
+    def __init__(self, max_bytes: int = 64 << 20):
+        """
+        Init for the MemoryCache
+        """
+        super().__init__(max_bytes)
+        self._values: OrderedDict[bytes, bytes] = OrderedDict()
+        self._size = 0
+
+    @property
+    def size(self) -> int:
+        """The total size of the stored values"""
+        return self._size
+
+    def __len__(self) -> int:
+        """The number of stored values"""
+        return len(self._values)
+
+    def _get(self, key: bytes) -> bytes | None:
+        """Get the value and move it to the end"""
+        value = self._values.get(key)
+        if value is not None:
+            self._values.move_to_end(key)
+        return value
+
+    def put(self, key: bytes, value: bytes):
+        """Store the value"""
+        if len(value) > self.max_bytes:
+            return
+        if key in self._values:
+            self._size -= len(self._values.pop(key))
+        self._values[key] = value
+        self._size += len(value)
+        while self._size > self.max_bytes:
+            _, evicted = self._values.popitem(last=False)
+            self._size -= len(evicted)
+
+
+class SQLiteCache(BaseCache):
+    """
+    The on-disk LRU cache, it survives restarts
+
+    A hit only reads: the LRU timestamps are kept in memory and written
+    with the next put, on close, or once FLUSH_EVERY of them pile up.
+    """
+
+    FLUSH_EVERY = 1024
+
+    def __init__(self, path: str, max_bytes: int = 1 << 30):
+        """
+        Init for the SQLiteCache
+
+        Args:
+            path: str - the database file
+            max_bytes: int - the maximal total size of the values
+        """
+        super().__init__(max_bytes)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key BLOB PRIMARY KEY, value BLOB NOT NULL, "
+            "size INTEGER NOT NULL, used INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS used ON cache (used)")
+        self._db.commit()
+        size, used = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0), COALESCE(MAX(used), 0) FROM cache"
+        ).fetchone()
+        self._size = size
+        self._clock = used
+        self._touched: dict[bytes, int] = {}
+
+    @property
+    def size(self) -> int:
+        """The total size of the stored values"""
+        return self._size
+
+    def __len__(self) -> int:
+        """The number of stored values"""
+        return self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def _tick(self) -> int:
+        """Get the next LRU timestamp"""
+        self._clock += 1
+        return self._clock
+
+    def _flush(self):
+        """Write the pending LRU timestamps, without committing"""
+        if self._touched:
+            self._db.executemany(
+                "UPDATE cache SET used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched = {}
+
+    def _get(self, key: bytes) -> bytes | None:
+        """Get the value and note its new timestamp"""
+        row = self._db.execute(
+            "SELECT value FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._touched[key] = self._tick()
+        if len(self._touched) >= self.FLUSH_EVERY:
+            self._flush()
+            self._db.commit()
+        return row[0]
+
+    def put(self, key: bytes, value: bytes):
+        """Store the value"""
+        if len(value) > self.max_bytes:
+            return
+        # The eviction below has to see the recent hits
+        self._flush()
+        old = self._db.execute(
+            "SELECT size FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if old is not None:
+            self._size -= old[0]
+        self._db.execute(
+            "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+            (key, value, len(value), self._tick()),
+        )
+        self._size += len(value)
+        while self._size > self.max_bytes:
+            evicted_key, evicted_size = self._db.execute(
+                "SELECT key, size FROM cache ORDER BY used LIMIT 1"
+            ).fetchone()
+            self._db.execute("DELETE FROM cache WHERE key = ?", (evicted_key,))
+            self._size -= evicted_size
+        self._db.commit()
+
+    def close(self):
+        """Write the pending timestamps and close the database"""
+        self._flush()
+        self._db.commit()
+        self._db.close()
+
+
+class CachedCompressor(BaseCompressor):
+    """
+    The compressor that skips the compression of the payloads it's seen
+
+    Attributes:
+        data - the data thet the compress stores.
+            It is stored compressed and it is decoded on using the property
+    """
+
+    def __init__(self, codec: str = "deflate", cache: BaseCache | None = None):
+        """
+        Init method for the CachedCompressor
+
+        Args:
+            codec: str - one of serialization.CODECS, it goes into the key
+            cache: BaseCache - where to keep the results, a new
+                MemoryCache if None
+        """
+        if codec not in serialization.CODECS:
+            raise ValueError(
+                f"Unknown codec {codec!r}, "
+                f"expected one of {serialization.CODECS}"
+            )
+        self._codec = codec
+        self.cache = cache if cache is not None else MemoryCache()
+        self._blob = serialization.compress(codec, b"")
+        self._is_str = False
+
+    def _key(self, data: bytes) -> bytes:
+        """Get the cache key for the data"""
+        digest = hashlib.blake2b(self._codec.encode("utf-8"), digest_size=16)
+        digest.update(b"\0" + data)
+        return digest.digest()
+
+    @property
+    def data(self) -> str | bytes:
+        """
+        Getter for the stored data
+
+        Returns:
+            str | bytes - the decoded data, of the same type it was given
+        """
+        result = serialization.decompress(self._blob)
+        return result.decode("utf-8") if self._is_str else result
+
+    @data.setter
+    def data(self, data: str | bytes):
+        """
+        Setter for the stored data
+        """
+        self._is_str = isinstance(data, str)
+        data = data.encode("utf-8") if self._is_str else bytes(data)
+        key = self._key(data)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._blob = cached
+            return
+        self._blob = serialization.compress(self._codec, data)
+        self.cache.put(key, self._blob)
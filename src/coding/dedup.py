@@ -0,0 +1,188 @@
+"""
+The deduplication encoder/decoder module
+
+lz77 only sees its buffer, so repeats that are far apart get compressed again.
+This cuts the data into content-defined chunks with a Gear rolling hash,
+keeps only the first copy of every chunk and leaves the rest to
+whatever compressor goes after it (lz77 by default).
+"""
+import hashlib
+import random
+from collections.abc import Sequence
+
+from base_encoder import BaseCompressor, BaseDecoder, BaseEncoder
+from lz77 import LZ77Compressor
+
+_MASK_64 = (1 << 64) - 1
+
+# The Gear table, it must be the same for everyone, hence the fixed seed
+GEAR = [random.Random(0x6EA2 + byte).getrandbits(64) for byte in range(256)]
+
+
+class DedupEncoder(BaseEncoder):
+    """
+    The deduplication encoder
+
+    Methods:
+        encode(stream: str | bytes) -> tuple: split the stream into chunks
+            and replace the repeated ones with references
+    """
+
+    def __init__(
+        self,
+        min_size: int = 2048,
+        avg_size: int = 8192,
+        max_size: int = 65536,
+    ):
+        """
+        Init for the deduplication encoder
+
+        Args:
+            min_size: int - the minimal chunk size
+            avg_size: int - the average chunk size,
+                rounded down to a power of 2
+            max_size: int - the maximal chunk size
+        """
+        self._min_size = min_size
+        self._max_size = max_size
+        # The top bits of the hash are the best mixed ones
+        self._mask = ((1 << (avg_size.bit_length() - 1)) - 1) << (
+            64 - avg_size.bit_length() + 1
+        )
+
+    def chunk_bounds(self, stream: str | bytes) -> list[int]:
+        """
+        Get the ends of the content-defined chunks
+
+        Returns:
+            list[int] - the end index of every chunk
+        """
+        values = stream if isinstance(stream, bytes) else map(ord, stream)
+        result = []
+        start = 0
+        fingerprint = 0
+        for i, value in enumerate(values):
+            fingerprint = ((fingerprint << 1) + GEAR[value & 0xFF]) & _MASK_64
+            size = i - start + 1
+            if size < self._min_size:
+                continue
+            if not fingerprint & self._mask or size >= self._max_size:
+                result.append(i + 1)
+                start = i + 1
+                fingerprint = 0
+        if start < len(stream):
+            result.append(len(stream))
+        return result
+
+    def encode(
+        self, stream: str | bytes
+    ) -> tuple[str | bytes, list[int], list[int]]:
+        """
+        Encode the given stream
+
+        Args:
+            stream: str | bytes - the stream of data
+
+        Returns:
+            tuple - the unique chunks joined together, their lengths,
+                and the chunk index for every chunk of the stream.
+                An index equal to the number of chunks seen so far
+                means a new chunk
+        """
+        index: dict[bytes, int] = {}
+        unique = []
+        lengths = []
+        refs = []
+        start = 0
+        for end in self.chunk_bounds(stream):
+            chunk = stream[start:end]
+            digest = hashlib.blake2b(
+                chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"),
+                digest_size=16,
+            ).digest()
+            if digest not in index:
+                index[digest] = len(unique)
+                unique.append(chunk)
+                lengths.append(len(chunk))
+            refs.append(index[digest])
+            start = end
+        return stream[:0].join(unique), lengths, refs
+
+
+class DedupDecoder(BaseDecoder):
+    """
+    The deduplication decoder
+
+    Methods:
+        decode(encoded_stream: tuple) -> str | bytes: put the chunks back
+    """
+
+    @staticmethod
+    def decode(
+        encoded_stream: tuple[str | bytes, list[int], list[int]]
+    ) -> str | bytes:
+        """
+        Decode the deduplicated stream
+        """
+        unique, lengths, refs = encoded_stream
+        chunks = []
+        start = 0
+        for length in lengths:
+            chunks.append(unique[start : start + length])
+            start += length
+        return unique[:0].join(chunks[ref] for ref in refs)
+
+
+class DedupCompressor(BaseCompressor):
+    """
+    The deduplicating compressor
+
+    Attributes:
+        data - the data thet the compress stores.
+            It is stored compressed and it is decoded on using the property
+    """
+
+    def __init__(
+        self,
+        compressor: BaseCompressor | None = None,
+        min_size: int = 2048,
+        avg_size: int = 8192,
+        max_size: int = 65536,
+    ):
+        """
+        Init method for the DedupCompressor
+
+        Args:
+            compressor: BaseCompressor - the compressor for the unique chunks,
+                LZ77Compressor by default
+        """
+        self._encoder = DedupEncoder(min_size, avg_size, max_size)
+        self._decoder = DedupDecoder()
+        self._compressor = compressor or LZ77Compressor()
+        self._lengths: list[int] = []
+        self._refs: list[int] = []
+        self._is_str = True
+
+    @property
+    def data(self) -> str | bytes:
+        """
+        Getter for the stored data
+
+        Returns:
+            str | bytes - the decoded data
+        """
+        unique: Sequence = self._compressor.data
+        if self._is_str:
+            unique = "".join(unique)
+        else:
+            unique = bytes(unique)
+        return self._decoder.decode((unique, self._lengths, self._refs))
+
+    @data.setter
+    def data(self, data: str | bytes):
+        """
+        Setter for the stored data
+        """
+        self._is_str = isinstance(data, str)
+        unique, self._lengths, self._refs = self._encoder.encode(data)
+        self._compressor.data = unique
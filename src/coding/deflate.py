@@ -7,6 +7,22 @@ from typing import Any
 from base_encoder import BaseCompressor, BaseDecoder, BaseEncoder
 from huffmann import HuffmannDecoder, HuffmannEncoder
 from lz77 import LZ77Decoder, LZ77Encoder
+from tans import TANSDecoder, TANSEncoder
+
+# The entropy coders that can go after lz77
+BACKENDS = {
+    "huffmann": (HuffmannEncoder, HuffmannDecoder),
+    "tans": (TANSEncoder, TANSDecoder),
+}
+
+
+def _get_backend(backend: str) -> tuple[type, type]:
+    """Get the (encoder, decoder) classes for the backend name"""
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown backend {backend!r}, expected one of {list(BACKENDS)}"
+        )
+    return BACKENDS[backend]
 
 
 class DeflateEncoder(BaseEncoder):
@@ -34,15 +50,21 @@ class DeflateEncoder(BaseEncoder):
     with this, but in this specific case, storing messages in bytes is fine.
     """
 
-    def __init__(self, buf_size: int = 128):
-        """Init for the encoder"""
-        self._huffmann = HuffmannEncoder()
+    def __init__(self, buf_size: int = 128, backend: str = "huffmann"):
+        """
+        Init for the encoder
+
+        Args:
+            buf_size: int - the lz77 buffer size
+            backend: str - the entropy coder, "huffmann" or "tans"
+        """
+        self._entropy = _get_backend(backend)[0]()
         self._lz77 = LZ77Encoder(buf_size)
 
-    def encode(self, stream: Sequence) -> list:
+    def encode(self, stream: Sequence) -> Sequence:
         """Encode the stream"""
-        result = self._huffmann.encode(self._lz77.encode(stream))
-        self.alphabet = self._huffmann.alphabet
+        result = self._entropy.encode(self._lz77.encode(stream))
+        self.alphabet = self._entropy.alphabet
         return result
 
 
@@ -51,33 +73,36 @@ class DeflateDecoder(BaseDecoder):
     The decoder for the deflate class
     """
 
-    def __init__(self):
+    def __init__(self, backend: str = "huffmann"):
         """Init for the decoder"""
-        self._huffmann = HuffmannDecoder()
+        self._entropy = _get_backend(backend)[1]()
         self._lz77 = LZ77Decoder()
 
     def decode(
-        self, encoded_stream: list[str], alphabet: dict[bytes, Any]
+        self, encoded_stream: Sequence, alphabet: dict[Any, Any]
     ) -> Sequence:
         """Decode the stream"""
         return self._lz77.decode(
-            self._huffmann.decode(encoded_stream, alphabet)
+            self._entropy.decode(encoded_stream, alphabet)
         )
 
 
 class DeflateCompressor:
     """The compressor class"""
 
-    def __init__(self, buf_size: int = 128):
+    def __init__(self, buf_size: int = 128, backend: str = "huffmann"):
         """Init for the class"""
-        self._encoder = DeflateEncoder(buf_size)
-        self._decoder = DeflateDecoder()
-        self._data: list[tuple[int, int]] = []
-        self.alphabet: dict[bytes, Any] = {}
+        self._backend = backend
+        self._encoder = DeflateEncoder(buf_size, backend)
+        self._decoder = DeflateDecoder(backend)
+        self._data: Sequence = []
+        self.alphabet: dict[Any, Any] = {}
 
     @property
     def data(self) -> Sequence:
         """Get the data"""
+        if self._backend == "tans":
+            return self._decoder.decode(self._data, self.alphabet)
         return self._decoder.decode(
             ["0" * x[0] + bin(x[1])[2:] for x in self._data],
             self.alphabet,
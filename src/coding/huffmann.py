@@ -19,17 +19,30 @@ class HuffmannEncoder(BaseEncoder):
         encode(stream: Sequence) -> Sequence: encodes the stream with Huffmann Code
     """
 
-    def encode(self, stream: Sequence) -> list[tuple[int, int]]:
+    def encode(
+        self, stream: Sequence, alphabet: dict[bytes, Any] | None = None
+    ) -> list[tuple[int, int]]:
         """
         Encode the given stream
 
         Args:
             stream: Sequence - the stream of data
+            alphabet: dict[bytes, Any] - an already made alphabet to use,
+                e.g. one shared between many streams
 
         Returns:
             Sequence - the encoded data
         """
-        self.alphabet: dict = self.make_alphabet(Counter(stream))
+        if alphabet is not None:
+            self.alphabet: dict = {
+                symbol: code.decode("utf-8")
+                for code, symbol in alphabet.items()
+            }
+        else:
+            self.alphabet = self.make_alphabet(Counter(stream))
+        if not stream:
+            self.alphabet = {}
+            return []
         # result = bytearray()
         result = [""]
         for symbol in stream[::-1]:
@@ -56,21 +69,31 @@ class HuffmannEncoder(BaseEncoder):
         """
         Make the alphabet from the given frequencies
         """
-        result = {}
-        freq_tree = [[freq, [symbol, ""]] for symbol, freq in counter.items()]
+        if len(counter) < 2:
+            return {symbol: "0" for symbol in counter}
+        # The second item breaks the ties, so that the symbols
+        # themselves never get compared (they may be of different types)
+        freq_tree = [
+            [freq, idx, [symbol, ""]]
+            for idx, (symbol, freq) in enumerate(counter.items())
+        ]
         heapq.heapify(freq_tree)
+        idx = len(freq_tree)
         while len(freq_tree) > 1:
             low = heapq.heappop(freq_tree)
 
             high = heapq.heappop(freq_tree)
-            for val in low[1:]:
+            for val in low[2:]:
                 val[1] = "0" + val[1]
 
-            for val in high[1:]:
+            for val in high[2:]:
                 val[1] = "1" + val[1]
 
-            heapq.heappush(freq_tree, [low[0] + high[0]] + low[1:] + high[1:])
-        return dict(tuple(x) for x in freq_tree[0][1:])
+            heapq.heappush(
+                freq_tree, [low[0] + high[0], idx] + low[2:] + high[2:]
+            )
+            idx += 1
+        return dict(tuple(x) for x in freq_tree[0][2:])
 
 
 class HuffmannDecoder(BaseDecoder):
@@ -100,10 +123,12 @@ class HuffmannDecoder(BaseDecoder):
         result = []
         while i:
             for code, symbol in alphabet.items():
-                if i.startswith(code):
+                if code and i.startswith(code):
                     i = i[len(code) :]
                     result.append(symbol)
                     break
+            else:
+                raise ValueError(f"No code matches the bits {i[:32]!r}")
         return result
 
 
@@ -42,18 +42,23 @@ class LZWEncoder(BaseEncoder):
         Returns:
             A list of integers which represent encoded data.
         '''
+        # Fresh copies every call, so that neither the default arguments
+        # nor the base table grow between calls
+        encoded_data = list(encoded_data)
+        table = dict(self._dict)
+        num = self._num
         for char in data:
             new_code = elem + char
-            if new_code in self._dict:
+            if new_code in table:
                 elem = new_code
             else:
-                encoded_data.append(self._dict[elem])
-                self._dict[new_code] = self._num
-                self._num += 1
+                encoded_data.append(table[elem])
+                table[new_code] = num
+                num += 1
                 elem = char
 
         if elem:
-            encoded_data.append(self._dict[elem])
+            encoded_data.append(table[elem])
 
         return encoded_data
 
@@ -90,20 +95,25 @@ class LZWDecoder(BaseDecoder):
         Returns:
             A string which represent decoded data.
         '''
+        # Fresh copies every call, so that neither the default arguments
+        # nor the base table grow between calls
+        decoded_data = list(decoded_data)
+        table = dict(self._dict)
+        num = self._num
         for code in data:
-            if code in self._dict:
-                entry = self._dict[code]
+            if code in table:
+                entry = table[code]
                 decoded_data.append(entry)
                 if elem:
-                    self._dict[self._num] = elem + entry[0]
-                    self._num += 1
+                    table[num] = elem + entry[0]
+                    num += 1
                 elem = entry
             else:
                 entry = elem + elem[0]
                 decoded_data.append(entry)
-                self._dict[self._num] = entry
-                self._num += 1
-                elem = entry[-1]
+                table[num] = entry
+                num += 1
+                elem = entry
 
         return ''.join(decoded_data)
 
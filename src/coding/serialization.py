@@ -0,0 +1,444 @@
+"""
+The serialization module
+
+Turns the codec output (the encoded stream and its alphabet) into bytes
+and back, without pickle, so that it's safe to take from the network.
+Everything is varints and raw bytes, and every read is checked.
+
+A blob is one codec tag byte and then, depending on the codec:
+    lz77:          tokens
+    lzw:           codes
+    huffmann:      huffmann alphabet | huffmann code, over the bytes
+    deflate:       huffmann alphabet | huffmann code, over the lz77 tokens
+    deflate-tans:  tans alphabet | tans code, over the lz77 tokens
+where
+    tokens:            count | token * count
+    codes:             count | code * count
+    huffmann alphabet: entries | (token, bits | code) * entries
+    huffmann code:     chunks | (bits | chunk) * chunks
+    tans alphabet:     entries | (token, frequency) * entries
+    tans code:         size | stream
+and a token is a varint below 256 for a literal byte, or 255 + length
+and then the distance back for a match. The parts are also written and
+read on their own, e.g. batch.py keeps one alphabet for many messages.
+"""
+from collections.abc import Callable, Sequence
+from typing import Any
+
+from deflate import DeflateEncoder
+from huffmann import HuffmannEncoder
+from lz77 import LZ77Decoder, LZ77Encoder
+from lzw import LZWDecoder, LZWEncoder
+from tans import MAX_TABLE_LOG, TANSDecoder
+
+CODECS = ("lz77", "lzw", "huffmann", "deflate", "deflate-tans")
+
+# The most bytes a blob may decode to
+MAX_OUTPUT = 64 << 20
+# The most entries a huffmann or tans alphabet may have
+MAX_ALPHABET = 1 << 16
+
+
+class Reader:
+    """
+    The reader that checks every read against the end of the data
+    """
+
+    def __init__(self, data: bytes):
+        """Init for the reader"""
+        self._data = data
+        self._pos = 0
+
+    def varint(self) -> int:
+        """Read an unsigned LEB128 varint"""
+        return self.varints(1)[0]
+
+    def varints(self, count: int) -> list[int]:
+        """Read count varints, in one go"""
+        data = self._data
+        pos = self._pos
+        result = []
+        for _ in range(count):
+            value = 0
+            shift = 0
+            while True:
+                if pos >= len(data):
+                    raise ValueError("Truncated varint")
+                if shift > 63:
+                    raise ValueError("Varint too long")
+                byte = data[pos]
+                pos += 1
+                value |= (byte & 0x7F) << shift
+                shift += 7
+                if byte < 0x80:
+                    break
+            result.append(value)
+        self._pos = pos
+        return result
+
+    def count(self, limit: int) -> int:
+        """Read a varint that must not be over the limit"""
+        value = self.varint()
+        if value > limit:
+            raise ValueError(f"Count {value} is over the limit {limit}")
+        return value
+
+    def read(self, size: int) -> bytes:
+        """Read size bytes"""
+        if self._pos + size > len(self._data):
+            raise ValueError("Truncated data")
+        result = self._data[self._pos : self._pos + size]
+        self._pos += size
+        return bytes(result)
+
+    def left(self) -> int:
+        """The number of unread bytes"""
+        return len(self._data) - self._pos
+
+    def finish(self):
+        """Check that everything was read"""
+        if self._pos != len(self._data):
+            raise ValueError("Trailing data")
+
+
+def varint(value: int) -> bytes:
+    """Write an unsigned LEB128 varint"""
+    result = bytearray()
+    write_varints(result, (value,))
+    return bytes(result)
+
+
+def write_varints(out: bytearray, values: Sequence[int]):
+    """Write the unsigned LEB128 varints, in one go"""
+    for value in values:
+        while value >= 0x80:
+            out.append(value & 0x7F | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+def _write_token(out: bytearray, token: Any):
+    """Write a literal byte or a (distance, length) match"""
+    if isinstance(token, tuple):
+        dist, length = token
+        out += varint(255 + length) + varint(-dist)
+    else:
+        out += varint(token)
+
+
+def _read_token(reader: Reader) -> int | tuple[int, int]:
+    """Read a literal byte or a (distance, length) match"""
+    value = reader.varint()
+    if value < 256:
+        return value
+    dist = reader.varint()
+    if dist < 1:
+        raise ValueError("Match distance must be at least 1")
+    return (-dist, value - 255)
+
+
+def check_tokens(tokens: Sequence, max_output: int):
+    """Check that the lz77 tokens don't decode to more than max_output"""
+    size = 0
+    for token in tokens:
+        size += token[1] if isinstance(token, tuple) else 1
+    if size > max_output:
+        raise ValueError(f"Output of {size} bytes is over {max_output}")
+
+
+def _write_bits(out: bytearray, bits: str):
+    """Write a bit string as its length and big-endian bytes"""
+    out += varint(len(bits))
+    out += int(bits, 2).to_bytes((len(bits) + 7) // 8, "big")
+
+
+def _read_bits(reader: Reader) -> str:
+    """Read a bit string written by _write_bits"""
+    size = reader.count(reader.left() * 8)
+    value = int.from_bytes(reader.read((size + 7) // 8), "big")
+    if value >> size:
+        raise ValueError("Bit string has more bits than its length")
+    return format(value, f"0{size}b") if size else ""
+
+
+def write_tokens(out: bytearray, tokens: Sequence):
+    """Write the lz77 tokens"""
+    out += varint(len(tokens))
+    for token in tokens:
+        _write_token(out, token)
+
+
+def read_tokens(reader: Reader, max_output: int) -> list:
+    """Read the lz77 tokens"""
+    tokens = [
+        _read_token(reader) for _ in range(reader.count(reader.left()))
+    ]
+    check_tokens(tokens, max_output)
+    return tokens
+
+
+def write_codes(out: bytearray, codes: Sequence[int]):
+    """Write the LZW codes"""
+    out += varint(len(codes))
+    write_varints(out, codes)
+
+
+def read_codes(reader: Reader, max_output: int) -> list[int]:
+    """Read the LZW codes of a stream over the 256 byte values"""
+    codes = reader.varints(reader.count(reader.left()))
+    # The n-th new entry is at most n + 1 long
+    if sum(1 if code < 256 else code - 254 for code in codes) > max_output:
+        raise ValueError(f"Output is over {max_output} bytes")
+    if codes and codes[0] >= 256:
+        raise ValueError("The first LZW code must be a single symbol")
+    return codes
+
+
+def write_huffmann_alphabet(out: bytearray, alphabet: dict[bytes, Any]):
+    """Write the alphabet of HuffmannEncoder"""
+    out += varint(len(alphabet))
+    for bits, symbol in alphabet.items():
+        _write_token(out, symbol)
+        _write_bits(out, bits.decode("utf-8"))
+
+
+def read_huffmann_alphabet(reader: Reader) -> dict[str, Any]:
+    """
+    Read the Huffmann alphabet
+
+    Returns:
+        dict[str, Any] - the symbol for every code
+    """
+    codes: dict[str, Any] = {}
+    for _ in range(reader.count(MAX_ALPHABET)):
+        symbol = _read_token(reader)
+        bits = _read_bits(reader)
+        if not bits or bits in codes:
+            raise ValueError("Empty or repeated Huffmann code")
+        codes[bits] = symbol
+    return codes
+
+
+def write_huffmann_code(out: bytearray, code: list[tuple[int, int]]):
+    """Write the chunks of HuffmannEncoder"""
+    out += varint(len(code))
+    for zeros, value in code:
+        _write_bits(out, "0" * zeros + bin(value)[2:])
+
+
+def read_huffmann_code(reader: Reader, codes: dict[str, Any]) -> list:
+    """Read and decode the Huffmann chunks"""
+    chunks = [
+        _read_bits(reader) for _ in range(reader.count(reader.left()))
+    ]
+    # Grow the prefix until it's a code, that way a bad stream can't spin
+    max_len = max(map(len, codes), default=0)
+    result = []
+    for chunk in chunks:
+        start = 0
+        while start < len(chunk):
+            end = start + 1
+            while chunk[start:end] not in codes:
+                if end - start >= max_len or end >= len(chunk):
+                    raise ValueError("Bits that match no Huffmann code")
+                end += 1
+            result.append(codes[chunk[start:end]])
+            start = end
+    return result
+
+
+def write_tans_alphabet(out: bytearray, alphabet: dict[Any, int]):
+    """Write the normalised frequencies of TANSEncoder"""
+    out += varint(len(alphabet))
+    for symbol, freq in alphabet.items():
+        _write_token(out, symbol)
+        out += varint(freq)
+
+
+def read_tans_alphabet(reader: Reader) -> dict[Any, int]:
+    """Read the normalised tANS frequencies"""
+    alphabet = {}
+    for _ in range(reader.count(MAX_ALPHABET)):
+        symbol = _read_token(reader)
+        freq = reader.count(1 << MAX_TABLE_LOG)
+        if not freq or symbol in alphabet:
+            raise ValueError("Zero or repeated tANS frequency")
+        alphabet[symbol] = freq
+    total = sum(alphabet.values())
+    if total & (total - 1) or total > 1 << MAX_TABLE_LOG:
+        raise ValueError("tANS frequencies must sum to a power of 2")
+    return alphabet
+
+
+def write_tans_code(out: bytearray, code: bytes):
+    """Write the output of TANSEncoder"""
+    out += varint(len(code)) + code
+
+
+def read_tans_code(
+    reader: Reader,
+    alphabet: dict[Any, int],
+    max_output: int,
+    decoder: TANSDecoder | None = None,
+) -> list:
+    """
+    Read and decode the tANS stream
+
+    Args:
+        reader: Reader - where to read from
+        alphabet: dict[Any, int] - the normalised frequencies
+        max_output: int - the most symbols the stream may have
+        decoder: TANSDecoder - e.g. one that already has the table for
+            the alphabet, a new one if None
+    """
+    code = reader.read(reader.count(reader.left()))
+    if len(code) < 4:
+        raise ValueError("Truncated tANS stream")
+    length = int.from_bytes(code[:4], "little")
+    if length > max_output:
+        raise ValueError(f"Output is over {max_output} bytes")
+    if length and not alphabet:
+        raise ValueError("tANS stream without an alphabet")
+    return (decoder or TANSDecoder()).decode(code, alphabet)
+
+
+def _encode_lz77(data: bytes) -> bytes:
+    """lz77 only"""
+    out = bytearray()
+    write_tokens(out, LZ77Encoder().encode(data))
+    return bytes(out)
+
+
+def _decode_lz77(reader: Reader, max_output: int) -> bytes:
+    """lz77 only"""
+    tokens = read_tokens(reader, max_output)
+    reader.finish()
+    return bytes(LZ77Decoder.decode(tokens))
+
+
+def _encode_lzw(data: bytes) -> bytes:
+    """LZW over the latin-1 text"""
+    out = bytearray()
+    write_codes(out, LZWEncoder().encode(data.decode("latin-1")))
+    return bytes(out)
+
+
+def _decode_lzw(reader: Reader, max_output: int) -> bytes:
+    """LZW over the latin-1 text"""
+    codes = read_codes(reader, max_output)
+    reader.finish()
+    return LZWDecoder().decode(codes).encode("latin-1")
+
+
+def _encode_huffmann(data: bytes) -> bytes:
+    """Huffmann over the bytes"""
+    encoder = HuffmannEncoder()
+    code = encoder.encode(data)
+    out = bytearray()
+    write_huffmann_alphabet(out, encoder.alphabet)
+    write_huffmann_code(out, code)
+    return bytes(out)
+
+
+def _decode_huffmann(reader: Reader, max_output: int) -> bytes:
+    """Huffmann over the bytes"""
+    symbols = read_huffmann_code(reader, read_huffmann_alphabet(reader))
+    reader.finish()
+    if len(symbols) > max_output:
+        raise ValueError(f"Output is over {max_output} bytes")
+    if any(isinstance(symbol, tuple) for symbol in symbols):
+        raise ValueError("Huffmann symbols must be bytes")
+    return bytes(symbols)
+
+
+def _encode_deflate(data: bytes) -> bytes:
+    """lz77 and Huffmann"""
+    encoder = DeflateEncoder()
+    code = encoder.encode(data)
+    out = bytearray()
+    write_huffmann_alphabet(out, encoder.alphabet)
+    write_huffmann_code(out, code)
+    return bytes(out)
+
+
+def _decode_deflate(reader: Reader, max_output: int) -> bytes:
+    """lz77 and Huffmann"""
+    tokens = read_huffmann_code(reader, read_huffmann_alphabet(reader))
+    reader.finish()
+    check_tokens(tokens, max_output)
+    return bytes(LZ77Decoder.decode(tokens))
+
+
+def _encode_deflate_tans(data: bytes) -> bytes:
+    """lz77 and tANS"""
+    encoder = DeflateEncoder(backend="tans")
+    code = encoder.encode(data)
+    out = bytearray()
+    write_tans_alphabet(out, encoder.alphabet)
+    write_tans_code(out, code)
+    return bytes(out)
+
+
+def _decode_deflate_tans(reader: Reader, max_output: int) -> bytes:
+    """lz77 and tANS"""
+    tokens = read_tans_code(reader, read_tans_alphabet(reader), max_output)
+    reader.finish()
+    check_tokens(tokens, max_output)
+    return bytes(LZ77Decoder.decode(tokens))
+
+
+_ENCODERS: dict[str, Callable[[bytes], bytes]] = {
+    "lz77": _encode_lz77,
+    "lzw": _encode_lzw,
+    "huffmann": _encode_huffmann,
+    "deflate": _encode_deflate,
+    "deflate-tans": _encode_deflate_tans,
+}
+
+_DECODERS: dict[str, Callable[[Reader, int], bytes]] = {
+    "lz77": _decode_lz77,
+    "lzw": _decode_lzw,
+    "huffmann": _decode_huffmann,
+    "deflate": _decode_deflate,
+    "deflate-tans": _decode_deflate_tans,
+}
+
+
+def compress(codec: str, data: bytes) -> bytes:
+    """
+    Compress the data and serialize the result
+
+    Args:
+        codec: str - one of CODECS
+        data: bytes - the data
+
+    Returns:
+        bytes - the blob, it starts with the codec tag
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec {codec!r}, expected one of {CODECS}")
+    return bytes([CODECS.index(codec)]) + _ENCODERS[codec](bytes(data))
+
+
+def decompress(blob: bytes, max_output: int = MAX_OUTPUT) -> bytes:
+    """
+    Read the blob and decompress it
+
+    Args:
+        blob: bytes - the output of compress
+        max_output: int - refuse the blobs that decode to more bytes
+
+    Returns:
+        bytes - the data
+
+    Raises:
+        ValueError - if the blob is malformed
+    """
+    if not blob:
+        raise ValueError("Empty blob")
+    if blob[0] >= len(CODECS):
+        raise ValueError(f"Unknown codec tag {blob[0]}")
+    try:
+        return _DECODERS[CODECS[blob[0]]](Reader(blob[1:]), max_output)
+    except (IndexError, KeyError, TypeError, OverflowError) as err:
+        raise ValueError(f"Malformed blob: {err!r}") from err
@@ -0,0 +1,529 @@
+"""
+The compression server module
+
+Instead of every service doing its own compression, one local server does it
+for everyone: a pre-forked pool of worker processes behind a unix socket
+(or localhost TCP), a small binary protocol with pipelining, a pooled client
+and a load generator to see how fast all of it is.
+
+The protocol, everything little-endian:
+    request:  u32 id | u8 op | u8 codec | u32 length | payload
+    response: u32 id | u8 status | u32 length | payload
+op is OP_COMPRESS or OP_DECOMPRESS, codec is an index into CODECS and is
+ignored for OP_DECOMPRESS. A compressed payload is a serialization.py blob,
+it names its own codec and is only ever read as data.
+status is STATUS_OK, STATUS_ERROR, or STATUS_CLOSING if the server is about
+to close the connection.
+
+The codec tables (e.g. the LZW base tables) are built when the modules are
+imported, before the workers are forked, so every worker starts warm.
+
+Usage:
+    python server.py serve --unix /tmp/coding.sock
+    python server.py bench --unix /tmp/coding.sock --clients 8
+"""
+import argparse
+import os
+import queue
+import signal
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+
+import serialization
+from serialization import CODECS
+
+OP_COMPRESS = 0
+OP_DECOMPRESS = 1
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_CLOSING = 2
+
+REQUEST = struct.Struct("<IBBI")
+RESPONSE = struct.Struct("<IBI")
+MAX_PAYLOAD = serialization.MAX_OUTPUT
+
+Address = str | tuple[str, int]
+
+
+class ServerError(Exception):
+    """
+    The error the server sent back
+    """
+
+
+def process_request(op: int, codec: int, payload: bytes) -> bytes:
+    """
+    Do the compression or decompression
+
+    Args:
+        op: int - OP_COMPRESS or OP_DECOMPRESS
+        codec: int - the codec index in CODECS, only for OP_COMPRESS
+        payload: bytes - the data
+
+    Returns:
+        bytes - the result
+    """
+    if op == OP_DECOMPRESS:
+        return serialization.decompress(payload, MAX_PAYLOAD)
+    if op != OP_COMPRESS:
+        raise ValueError(f"Unknown op {op}")
+    if codec >= len(CODECS):
+        raise ValueError(f"Unknown codec {codec}")
+    return serialization.compress(CODECS[codec], payload)
+
+
+def _recv_exactly(conn: socket.socket, size: int) -> bytes:
+    """
+    Read exactly size bytes, or b"" if the connection is closed first
+    """
+    result = bytearray()
+    while len(result) < size:
+        chunk = conn.recv(size - len(result))
+        if not chunk:
+            return b""
+        result += chunk
+    return bytes(result)
+
+
+def _make_socket(address: Address) -> socket.socket:
+    """Make a socket of the right family for the address"""
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+
+class CompressionServer:
+    """
+    The pre-forking compression server
+
+    Every worker process accepts connections on the same socket and serves
+    each one in a thread, answering the requests in the order they came.
+    A worker with max_connections open connections stops accepting and
+    leaves the new ones to the others. Only works where there's os.fork.
+    """
+
+    def __init__(
+        self,
+        address: Address,
+        workers: int | None = None,
+        max_connections: int = 64,
+        timeout: float | None = 30.0,
+    ):
+        """
+        Init for the server
+
+        Args:
+            address: str | tuple[str, int] - a unix socket path
+                or (host, port)
+            workers: int - the number of worker processes,
+                one per core if None
+            max_connections: int - the most connections a worker serves
+                at once
+            timeout: float - close the connections that send nothing for
+                this many seconds, None to wait forever
+        """
+        self.address = address
+        self._workers = workers or os.cpu_count() or 1
+        self._max_connections = max_connections
+        self._timeout = timeout
+        self._socket: socket.socket | None = None
+        self._pids: list[int] = []
+
+    def bind(self):
+        """
+        Bind and listen. Called by serve_forever if it wasn't already
+        """
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+        self._socket = _make_socket(self.address)
+        if not isinstance(self.address, str):
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(self.address)
+        self._socket.listen(128)
+        # The real port, if 0 was asked for
+        self.address = self._socket.getsockname()
+
+    def serve_forever(self):
+        """
+        Fork the workers and wait for them, until SIGINT or SIGTERM
+        """
+        if self._socket is None:
+            self.bind()
+        for _ in range(self._workers):
+            pid = os.fork()
+            if pid == 0:
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                try:
+                    self._accept_loop()
+                finally:
+                    os._exit(0)
+            self._pids.append(pid)
+
+        def stop(*_):
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGTERM, stop)
+        try:
+            for pid in self._pids:
+                os.waitpid(pid, 0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """
+        Kill the workers and close the socket
+        """
+        for pid in self._pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self._pids = []
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.unlink(self.address)
+
+    def _accept_loop(self):
+        """The worker's main loop"""
+        slots = threading.BoundedSemaphore(self._max_connections)
+        while True:
+            # While all the slots are taken the other workers accept
+            slots.acquire()
+            conn, _ = self._socket.accept()
+            conn.settimeout(self._timeout)
+            threading.Thread(
+                target=self._handle, args=(conn, slots), daemon=True
+            ).start()
+
+    @classmethod
+    def _handle(cls, conn: socket.socket, slots: threading.BoundedSemaphore):
+        """Serve one connection, then give its slot back"""
+        try:
+            with conn:
+                cls._serve(conn)
+        except OSError:
+            # The client hung up or went quiet, there's no one to answer
+            pass
+        finally:
+            slots.release()
+
+    @staticmethod
+    def _serve(conn: socket.socket):
+        """Answer the requests until the connection is closed"""
+        while header := _recv_exactly(conn, REQUEST.size):
+            request_id, op, codec, length = REQUEST.unpack(header)
+            if length > MAX_PAYLOAD:
+                # The payload is never read, so the stream is out of sync
+                error = f"Payload too large: {length}".encode("utf-8")
+                conn.sendall(
+                    RESPONSE.pack(request_id, STATUS_CLOSING, len(error))
+                    + error
+                )
+                return
+            payload = _recv_exactly(conn, length)
+            if len(payload) < length:
+                return
+            try:
+                result = process_request(op, codec, payload)
+                status = STATUS_OK
+            except Exception as err:
+                result = f"{type(err).__name__}: {err}".encode("utf-8")
+                status = STATUS_ERROR
+            conn.sendall(
+                RESPONSE.pack(request_id, status, len(result)) + result
+            )
+
+
+class CompressionClient:
+    """
+    The client for one connection to the server
+
+    Attributes:
+        closed: bool - whether the connection is closed
+
+    Methods:
+        compress(data, codec) -> bytes: compress the data
+        decompress(blob) -> bytes: decompress the data
+        pipeline(requests, window) -> list[bytes]: send many requests
+            without waiting for each answer
+    """
+
+    def __init__(self, address: Address):
+        """
+        Init for the client, connects right away
+        """
+        self._socket = _make_socket(address)
+        self._socket.connect(address)
+        self._next_id = 0
+        self.closed = False
+
+    def close(self):
+        """Close the connection"""
+        self._socket.close()
+        self.closed = True
+
+    def __enter__(self) -> "CompressionClient":
+        """Enter the context"""
+        return self
+
+    def __exit__(self, *_):
+        """Close on exit"""
+        self.close()
+
+    def _send(self, op: int, codec: str, payload: bytes) -> int:
+        """Send the request and get its id"""
+        request_id = self._next_id
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+        header = REQUEST.pack(
+            request_id, op, CODECS.index(codec), len(payload)
+        )
+        try:
+            self._socket.sendall(header + payload)
+        except OSError:
+            self.close()
+            raise
+        return request_id
+
+    def _receive(self, request_id: int) -> bytes:
+        """Get the response to the request"""
+        try:
+            header = _recv_exactly(self._socket, RESPONSE.size)
+            if not header:
+                raise ConnectionError("The server closed the connection")
+            response_id, status, length = RESPONSE.unpack(header)
+            payload = _recv_exactly(self._socket, length)
+            if len(payload) < length:
+                raise ConnectionError("The server closed the connection")
+            if response_id != request_id:
+                raise ConnectionError(
+                    f"Got response {response_id} instead of {request_id}"
+                )
+        except OSError:
+            # The connection is gone or out of sync, it's no use anymore
+            self.close()
+            raise
+        if status == STATUS_CLOSING:
+            self.close()
+        if status != STATUS_OK:
+            raise ServerError(payload.decode("utf-8"))
+        return payload
+
+    def compress(self, data: bytes, codec: str = "deflate") -> bytes:
+        """
+        Compress the data on the server
+        """
+        return self._receive(self._send(OP_COMPRESS, codec, data))
+
+    def decompress(self, blob: bytes) -> bytes:
+        """
+        Decompress the data on the server
+        """
+        return self._receive(self._send(OP_DECOMPRESS, CODECS[0], blob))
+
+    def pipeline(
+        self, requests: Iterable[tuple[int, str, bytes]], window: int = 32
+    ) -> list[bytes]:
+        """
+        Send the (op, codec, payload) requests, keeping up to window of
+        them unanswered at once. After an error no more requests are sent
+
+        Returns:
+            list[bytes] - the results, in the same order
+
+        Raises:
+            ServerError - the first error, once every sent request
+                is answered, so that the connection can still be used
+        """
+        pending: deque[int] = deque()
+        result = []
+        errors: list[ServerError] = []
+
+        def receive():
+            try:
+                result.append(self._receive(pending.popleft()))
+            except ServerError as err:
+                if self.closed:
+                    raise
+                errors.append(err)
+
+        for op, codec, payload in requests:
+            if errors:
+                break
+            pending.append(self._send(op, codec, payload))
+            if len(pending) >= window:
+                receive()
+        while pending:
+            receive()
+        if errors:
+            raise errors[0]
+        return result
+
+
+class ClientPool:
+    """
+    The pool of persistent connections, safe to use from many threads
+    """
+
+    def __init__(self, address: Address, size: int = 4):
+        """
+        Init for the pool, the connections are made when first needed
+
+        Args:
+            address: str | tuple[str, int] - the server address
+            size: int - the maximal number of connections
+        """
+        self._address = address
+        self._idle: queue.LifoQueue[CompressionClient] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self) -> Iterator[CompressionClient]:
+        """
+        Borrow a connection, waiting if all of them are busy
+        """
+        with self._slots:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                client = CompressionClient(self._address)
+            try:
+                yield client
+            except ServerError:
+                raise
+            except BaseException:
+                client.close()
+                raise
+            finally:
+                # The server may have hung up, e.g. after a STATUS_CLOSING
+                if not client.closed:
+                    self._idle.put(client)
+
+    def compress(self, data: bytes, codec: str = "deflate") -> bytes:
+        """Compress the data on a pooled connection"""
+        with self.connection() as client:
+            return client.compress(data, codec)
+
+    def decompress(self, blob: bytes) -> bytes:
+        """Decompress the data on a pooled connection"""
+        with self.connection() as client:
+            return client.decompress(blob)
+
+    def close(self):
+        """Close all the idle connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def benchmark(
+    address: Address,
+    payload: bytes,
+    codec: str = "deflate",
+    clients: int = 8,
+    requests: int = 100,
+) -> dict[str, float]:
+    """
+    Hammer the server with compress requests from many threads
+
+    Args:
+        address: str | tuple[str, int] - the server address
+        payload: bytes - what to compress
+        codec: str - the codec name
+        clients: int - the number of threads, each with its own connection
+        requests: int - the number of requests per thread
+
+    Returns:
+        dict[str, float] - the p50 and p99 latency in ms and the requests/s
+    """
+    pool = ClientPool(address, clients)
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def run():
+        own = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            pool.compress(payload, codec)
+            own.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=run) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    pool.close()
+
+    latencies.sort()
+    p99_idx = min(len(latencies) - 1, len(latencies) * 99 // 100)
+    return {
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[p99_idx] * 1000,
+        "requests_per_s": len(latencies) / elapsed,
+    }
+
+
+def main():
+    """
+    The command line entry point
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("command", choices=("serve", "bench"))
+    parser.add_argument("--unix", help="the unix socket path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7077)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-connections", type=int, default=64)
+    parser.add_argument(
+        "--timeout", type=float, default=30.0, help="the idle timeout"
+    )
+    parser.add_argument("--codec", default="deflate", choices=CODECS)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument(
+        "--file", default=None, help="take the payload from this file"
+    )
+    args = parser.parse_args()
+    address = args.unix or (args.host, args.port)
+
+    if args.command == "serve":
+        CompressionServer(
+            address, args.workers, args.max_connections, args.timeout
+        ).serve_forever()
+        return
+
+    if args.file:
+        with open(args.file, "rb") as inp:
+            payload = inp.read(args.size)
+    else:
+        sentence = b"the quick brown fox jumps over the lazy dog "
+        payload = (sentence * (args.size // len(sentence) + 1))[: args.size]
+    stats = benchmark(
+        address, payload, args.codec, args.clients, args.requests
+    )
+    print(
+        f"p50 {stats['p50_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms, "
+        f"{stats['requests_per_s']:.1f} requests/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+The tANS (table-based asymmetric numeral system) encoder/decoder module
+
+Huffmann can only give whole-bit codes, so a symbol with probability 0.9 still
+costs a full bit. tANS keeps a state in [L, 2L) and spends fractional bits
+per symbol instead, which is a lot better on skewed streams like the lz77
+output.
+"""
+from collections import Counter
+from collections.abc import Sequence
+from typing import Any
+
+from base_encoder import BaseCompressor, BaseDecoder, BaseEncoder
+
+# The shift used in the branchless bit count computation
+_NB_BITS_SHIFT = 32
+# The largest table log, a table of that size is 1M states
+MAX_TABLE_LOG = 20
+
+
+def _spread_symbols(alphabet: dict[Any, int], table_log: int) -> list[Any]:
+    """
+    Spread the symbols over the state table, so that equal symbols
+    don't end up bunched together. Same step as in FSE.
+    """
+    table_size = 1 << table_log
+    mask = table_size - 1
+    step = (table_size >> 1) + (table_size >> 3) + 3
+    table: list[Any] = [None] * table_size
+    pos = 0
+    for symbol, freq in alphabet.items():
+        for _ in range(freq):
+            table[pos] = symbol
+            pos = (pos + step) & mask
+    return table
+
+
+def _table_log(alphabet: dict[Any, int]) -> int:
+    """
+    Get the table log from the normalised frequencies
+    """
+    return sum(alphabet.values()).bit_length() - 1
+
+
+class TANSEncoder(BaseEncoder):
+    """
+    The tANS encoder class
+
+    Methods:
+        encode(stream: Sequence) -> bytes: encodes the stream with tANS
+    """
+
+    def __init__(self, table_log: int = 11):
+        """
+        Init for the tANS encoder
+
+        Args:
+            table_log: int - the smallest log2 of the state table size,
+                bigger alphabets get bigger tables, see choose_table_log
+        """
+        self._table_log = table_log
+        self.alphabet: dict[Any, int] = {}
+        # The last tables made and the alphabet they were made for
+        self._table_items: list[tuple[Any, int]] = []
+        self._table: tuple[list[int], dict] = ([], {})
+
+    @staticmethod
+    def choose_table_log(symbols: int, table_log: int = 11) -> int:
+        """
+        Get the table log for an alphabet of the given size. With fewer
+        than 8 states per symbol the rounding of the frequencies costs
+        more than Huffmann loses on whole bits
+        """
+        if symbols > 1 << MAX_TABLE_LOG:
+            raise ValueError(f"Too many symbols for tANS: {symbols}")
+        return min(MAX_TABLE_LOG, max(table_log, symbols.bit_length() + 3))
+
+    @staticmethod
+    def normalise(counter: dict[Any, int], table_log: int) -> dict[Any, int]:
+        """
+        Scale the frequencies so that they sum up to 2 ** table_log,
+        while every symbol still gets at least one slot
+        """
+        table_size = 1 << table_log
+        total = sum(counter.values())
+        result = {
+            symbol: max(1, round(freq * table_size / total))
+            for symbol, freq in counter.items()
+        }
+        diff = table_size - sum(result.values())
+        by_freq = sorted(result, key=result.__getitem__, reverse=True)
+        if diff >= 0:
+            result[by_freq[0]] += diff
+            return result
+        while diff < 0:
+            for symbol in by_freq:
+                if diff == 0:
+                    break
+                if result[symbol] > 1:
+                    result[symbol] -= 1
+                    diff += 1
+        return result
+
+    @staticmethod
+    def make_table(
+        alphabet: dict[Any, int]
+    ) -> tuple[list[int], dict[Any, tuple[int, int, int]]]:
+        """
+        Make the encoding table from the normalised frequencies, grouped by
+        symbol in spread order, and the (delta bits, offset, frequency)
+        of every symbol
+        """
+        if not alphabet:
+            return [], {}
+        table_log = _table_log(alphabet)
+        table_size = 1 << table_log
+        encode_table: list[int] = [0] * table_size
+        symbol_info: dict[Any, tuple[int, int, int]] = {}
+        start = 0
+        for symbol, freq in alphabet.items():
+            max_bits = table_log
+            if freq > 1:
+                max_bits -= (freq - 1).bit_length() - 1
+            delta_nb_bits = (max_bits << _NB_BITS_SHIFT) - (freq << max_bits)
+            symbol_info[symbol] = (delta_nb_bits, start - freq, freq)
+            start += freq
+        next_slot = {
+            symbol: offset + freq
+            for symbol, (_, offset, freq) in symbol_info.items()
+        }
+        for pos, symbol in enumerate(_spread_symbols(alphabet, table_log)):
+            encode_table[next_slot[symbol]] = table_size + pos
+            next_slot[symbol] += 1
+        return encode_table, symbol_info
+
+    def encode(
+        self, stream: Sequence, alphabet: dict[Any, int] | None = None
+    ) -> bytes:
+        """
+        Encode the given stream
+
+        Args:
+            stream: Sequence - the stream of data
+            alphabet: dict[Any, int] - already normalised frequencies to use,
+                e.g. ones shared between many streams. The tables are only
+                made again when the alphabet changes
+
+        Returns:
+            bytes - the encoded data. The first 4 bytes are the stream length,
+                then go the final state and the bits themselves
+        """
+        if alphabet is not None:
+            self.alphabet = alphabet
+            table_log = _table_log(alphabet)
+        else:
+            counter = Counter(stream)
+            table_log = self.choose_table_log(len(counter), self._table_log)
+            self.alphabet = (
+                self.normalise(counter, table_log) if counter else {}
+            )
+        table_size = 1 << table_log
+        # The order matters too, it decides the spread
+        items = list(self.alphabet.items())
+        if items != self._table_items:
+            self._table = self.make_table(self.alphabet)
+            self._table_items = items
+        encode_table, symbol_info = self._table
+
+        # ANS is a stack, so encode backwards and let the decoder go forwards
+        state = table_size
+        chunks: list[tuple[int, int]] = []
+        for symbol in reversed(stream):
+            delta_nb_bits, offset, _ = symbol_info[symbol]
+            nb_bits = (state + delta_nb_bits) >> _NB_BITS_SHIFT
+            chunks.append((state & ((1 << nb_bits) - 1), nb_bits))
+            state = encode_table[offset + (state >> nb_bits)]
+        chunks.append((state - table_size, table_log))
+
+        result = bytearray(len(stream).to_bytes(4, "little"))
+        acc = 0
+        acc_len = 0
+        for value, nb_bits in reversed(chunks):
+            acc = (acc << nb_bits) | value
+            acc_len += nb_bits
+            while acc_len >= 8:
+                acc_len -= 8
+                result.append(acc >> acc_len)
+                acc &= (1 << acc_len) - 1
+        if acc_len:
+            result.append(acc << (8 - acc_len))
+        return bytes(result)
+
+
+class TANSDecoder(BaseDecoder):
+    """
+    The tANS decoder class
+
+    Methods:
+        decode(encoded_stream: bytes, alphabet: dict[Any, int]) -> list:
+            decode the tANS code
+    """
+
+    def __init__(self):
+        """
+        Init for the tANS decoder
+        """
+        # The last table made and the alphabet it was made for
+        self._table_items: list[tuple[Any, int]] = []
+        self._table: list[tuple[Any, int, int]] = []
+
+    @staticmethod
+    def make_table(alphabet: dict[Any, int]) -> list[tuple[Any, int, int]]:
+        """
+        Make the decoding table from the normalised frequencies.
+        Each entry is (symbol, bits to read, next state base)
+        """
+        table_log = _table_log(alphabet)
+        table_size = 1 << table_log
+        next_state = dict(alphabet)
+        table = []
+        for symbol in _spread_symbols(alphabet, table_log):
+            state = next_state[symbol]
+            next_state[symbol] += 1
+            nb_bits = table_log - (state.bit_length() - 1)
+            table.append((symbol, nb_bits, (state << nb_bits) - table_size))
+        return table
+
+    def decode(self, encoded_stream: bytes, alphabet: dict[Any, int]) -> list:
+        """
+        Decode the tANS code
+        """
+        length = int.from_bytes(encoded_stream[:4], "little")
+        if not length:
+            return []
+        # The order matters too, it decides the spread
+        items = list(alphabet.items())
+        if items != self._table_items:
+            self._table = self.make_table(alphabet)
+            self._table_items = items
+        table = self._table
+        table_log = _table_log(alphabet)
+        # Zero padding, so that the refill never has to check for the end
+        data = encoded_stream[4:] + bytes(table_log // 8 + 2)
+
+        acc = 0
+        acc_len = 0
+        pos = 0
+        while acc_len < table_log:
+            acc = (acc << 8) | data[pos]
+            pos += 1
+            acc_len += 8
+        acc_len -= table_log
+        state = acc >> acc_len
+        acc &= (1 << acc_len) - 1
+
+        result = []
+        for _ in range(length):
+            symbol, nb_bits, base = table[state]
+            result.append(symbol)
+            while acc_len < nb_bits:
+                acc = (acc << 8) | data[pos]
+                pos += 1
+                acc_len += 8
+            acc_len -= nb_bits
+            state = base + (acc >> acc_len)
+            acc &= (1 << acc_len) - 1
+        return result
+
+
+class TANSCompressor(BaseCompressor):
+    """
+    The compressor for the tANS code
+
+    Attributes:
+        data: Sequence - the compressed data
+    """
+
+    def __init__(self, table_log: int = 11):
+        """
+        The init method for TANSCompressor
+        """
+        self._encoder = TANSEncoder(table_log)
+        self._decoder = TANSDecoder()
+        self._data = bytes()
+
+    @property
+    def data(self) -> Sequence:
+        """
+        Getter for the data
+        """
+        return self._decoder.decode(self._data, self._encoder.alphabet)
+
+    @data.setter
+    def data(self, stream: Sequence):
+        """
+        Setter for the data
+        """
+        self._data = self._encoder.encode(stream)
@@ -0,0 +1,8 @@
+"""
+The modules import each other by their bare names, so put them on the path
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src", "coding"))
@@ -0,0 +1,61 @@
+"""
+Tests for the async_stream module
+"""
+import asyncio
+import socket
+
+import pytest
+
+from async_stream import AsyncCompressor
+from serialization import CODECS
+
+DATA = bytes(range(256)) + b"to be or not to be, that is the question " * 50
+
+
+async def _run(method, data: bytes) -> bytes:
+    """Run the compress or decompress coroutine over the data"""
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    left, right = socket.socketpair()
+    _, writer = await asyncio.open_connection(sock=left)
+    out, _ = await asyncio.open_connection(sock=right)
+
+    async def run():
+        try:
+            await method(reader, writer)
+        finally:
+            writer.close()
+
+    result, _ = await asyncio.gather(out.read(), run())
+    return result
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_round_trip(codec):
+    compressor = AsyncCompressor(codec, chunk_size=500, max_in_flight=2)
+    compressed = asyncio.run(_run(compressor.compress, DATA))
+    assert asyncio.run(_run(compressor.decompress, compressed)) == DATA
+
+
+def test_empty():
+    compressor = AsyncCompressor()
+    assert asyncio.run(_run(compressor.compress, b"")) == b""
+    assert asyncio.run(_run(compressor.decompress, b"")) == b""
+
+
+def test_bad_frame():
+    compressor = AsyncCompressor(chunk_size=500)
+    compressed = bytearray(asyncio.run(_run(compressor.compress, DATA)))
+    compressed[4] = 0xFF
+    with pytest.raises(ValueError):
+        asyncio.run(_run(compressor.decompress, bytes(compressed)))
+    with pytest.raises(ValueError):
+        asyncio.run(_run(compressor.decompress, b"\x01\x00"))
+
+
+def test_bad_arguments():
+    with pytest.raises(ValueError):
+        AsyncCompressor("zip")
+    with pytest.raises(ValueError):
+        AsyncCompressor(max_in_flight=0)
@@ -0,0 +1,118 @@
+"""
+Tests for the batch module
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import batch
+from batch import CompressedBatch, compress_many, decompress_many
+
+MESSAGES = [
+    "",
+    "a",
+    b"",
+    b"\x00\xff" * 20,
+    "hello, світ! " * 5,
+    "to be or not to be, that is the question",
+    b"GET /index.html HTTP/1.1\r\nHost: example.com\r\n\r\n",
+] + [f"record {i}: the quick brown fox" for i in range(20)]
+
+SETTINGS = [
+    ("lz77", "huffmann", False),
+    ("lzw", "huffmann", False),
+    ("deflate", "huffmann", False),
+    ("deflate", "huffmann", True),
+    ("deflate", "tans", False),
+    ("deflate", "tans", True),
+]
+
+
+@pytest.mark.parametrize("codec, backend, shared", SETTINGS)
+def test_round_trip(codec, backend, shared):
+    result = compress_many(
+        MESSAGES, codec, backend=backend, shared_alphabet=shared
+    )
+    assert len(result) == len(MESSAGES)
+    assert decompress_many(result) == MESSAGES
+
+
+@pytest.mark.parametrize("codec, backend, shared", SETTINGS)
+def test_to_bytes(codec, backend, shared):
+    result = compress_many(
+        MESSAGES, codec, backend=backend, shared_alphabet=shared
+    )
+    restored = CompressedBatch.from_bytes(result.to_bytes())
+    assert restored.codec == codec
+    assert restored.options == result.options
+    assert restored.alphabet == result.alphabet
+    assert decompress_many(restored) == MESSAGES
+
+
+@pytest.mark.parametrize("codec, backend, shared", SETTINGS)
+def test_empty(codec, backend, shared):
+    for messages in [[], [""], [b""]]:
+        result = compress_many(
+            messages, codec, backend=backend, shared_alphabet=shared
+        )
+        restored = CompressedBatch.from_bytes(result.to_bytes())
+        assert decompress_many(restored) == messages
+
+
+def test_offsets():
+    result = compress_many(MESSAGES, "lz77")
+    assert result.offsets[0] == 0
+    assert result.offsets[-1] == len(result.buffer)
+    assert bytes(result[-1]) == result.buffer[result.offsets[-2] :]
+
+
+def test_shared_alphabet_is_smaller():
+    messages = [f"user {i} logged in from 10.0.0.{i}" for i in range(200)]
+    own = compress_many(messages)
+    shared = compress_many(messages, shared_alphabet=True)
+    assert len(shared.to_bytes()) < len(own.to_bytes())
+    assert len(shared.to_bytes()) < sum(map(len, messages))
+
+
+@pytest.mark.parametrize("codec, backend, shared", SETTINGS)
+def test_executor(monkeypatch, codec, backend, shared):
+    monkeypatch.setattr(batch, "MIN_PARALLEL_SIZE", 0)
+    monkeypatch.setattr(batch, "_JOB_SIZE", 64)
+    with ThreadPoolExecutor(2) as executor:
+        result = compress_many(
+            MESSAGES,
+            codec,
+            backend=backend,
+            shared_alphabet=shared,
+            executor=executor,
+        )
+        assert decompress_many(result, executor) == MESSAGES
+    assert result.to_bytes() == compress_many(
+        MESSAGES, codec, backend=backend, shared_alphabet=shared
+    ).to_bytes()
+
+
+def test_bad_arguments():
+    with pytest.raises(ValueError):
+        compress_many(MESSAGES, "zip")
+    with pytest.raises(ValueError):
+        compress_many(MESSAGES, backend="zip")
+
+
+@pytest.mark.parametrize("codec, backend, shared", SETTINGS)
+def test_malformed(codec, backend, shared):
+    data = compress_many(
+        MESSAGES, codec, backend=backend, shared_alphabet=shared
+    ).to_bytes()
+    for end in range(0, len(data), 7):
+        with pytest.raises(ValueError):
+            CompressedBatch.from_bytes(data[:end])
+    with pytest.raises(ValueError):
+        CompressedBatch.from_bytes(data + b"\x00")
+
+
+def test_malformed_message():
+    result = compress_many(["abcabcabc"], "lz77")
+    result.buffer = result.buffer[:-1] + b"\x80"
+    with pytest.raises(ValueError):
+        decompress_many(result)
@@ -0,0 +1,52 @@
+"""
+Tests for the bwt module
+"""
+import random
+
+import pytest
+
+from bwt import BWTCompressor, BWTDecoder, BWTEncoder, suffix_array
+
+
+def _naive_suffix_array(text: list[int]) -> list[int]:
+    """Sort the suffixes the slow way"""
+    return sorted(range(len(text)), key=lambda i: text[i:])
+
+
+@pytest.mark.parametrize(
+    "text", [b"", b"a", b"banana", b"mississippi", b"aaaaaaaa", b"abab" * 9]
+)
+def test_suffix_array(text):
+    symbols = [byte + 1 for byte in text] + [0]
+    assert suffix_array(symbols, 257) == _naive_suffix_array(symbols)
+
+
+def test_suffix_array_random():
+    rng = random.Random(0)
+    for _ in range(50):
+        symbols = [rng.randint(1, 4) for _ in range(rng.randint(1, 200))]
+        symbols.append(0)
+        assert suffix_array(symbols, 5) == _naive_suffix_array(symbols)
+
+
+@pytest.mark.parametrize("block", [b"", b"x", b"banana", bytes(range(256))])
+def test_transform(block):
+    primary, last_column = BWTEncoder.transform(block)
+    assert BWTDecoder.inverse_transform(primary, last_column) == block
+
+
+def test_move_to_front():
+    block = b"aaaaabbbbbbbbbbbaaaaaaac" + bytes(300)
+    symbols = BWTEncoder.move_to_front(block)
+    assert BWTDecoder.move_to_front(symbols) == block
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 100_000])
+@pytest.mark.parametrize(
+    "data",
+    [b"", b"banana bandana", "hello, світ " * 30, bytes(range(256)) * 3],
+)
+def test_round_trip(block_size, data):
+    compressor = BWTCompressor(block_size)
+    compressor.data = data
+    assert compressor.data == data
@@ -0,0 +1,116 @@
+"""
+Tests for the cache module
+"""
+import sqlite3
+
+import pytest
+
+from cache import CachedCompressor, MemoryCache, SQLiteCache
+from serialization import CODECS
+
+TEXT = "the same config blob, over and over again " * 20
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    """Make a cache of either kind with the given max_bytes"""
+    caches = []
+
+    def make(max_bytes: int = 1 << 20):
+        if request.param == "memory":
+            cache = MemoryCache(max_bytes)
+        else:
+            cache = SQLiteCache(str(tmp_path / "cache.db"), max_bytes)
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        if isinstance(cache, SQLiteCache):
+            cache.close()
+
+
+def test_get_put(make_cache):
+    cache = make_cache()
+    assert cache.get(b"key") is None
+    cache.put(b"key", b"value")
+    assert cache.get(b"key") == b"value"
+    cache.put(b"key", b"other")
+    assert cache.get(b"key") == b"other"
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert cache.size == 5
+    assert len(cache) == 1
+
+
+def test_lru_eviction(make_cache):
+    cache = make_cache(10)
+    cache.put(b"a", b"12345")
+    cache.put(b"b", b"1234")
+    assert cache.get(b"a") == b"12345"
+    cache.put(b"c", b"12")
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") == b"12345"
+    assert cache.size <= 10
+    # Too big to ever fit
+    cache.put(b"d", b"x" * 11)
+    assert cache.get(b"d") is None
+
+
+def test_sqlite_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SQLiteCache(path, 10)
+    cache.put(b"a", b"12345")
+    cache.put(b"b", b"1234")
+    cache.get(b"a")
+    cache.close()
+    cache = SQLiteCache(path, 10)
+    assert cache.size == 9
+    # The hit on "a" made it to the disk, so "b" goes first
+    cache.put(b"c", b"12")
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") == b"12345"
+    cache.close()
+
+
+@pytest.mark.parametrize("codec", CODECS)
+@pytest.mark.parametrize("data", ["", TEXT, TEXT.encode("utf-8"), "світ"])
+def test_round_trip(codec, data):
+    compressor = CachedCompressor(codec)
+    compressor.data = data
+    assert compressor.data == data
+    compressor.data = data
+    assert compressor.data == data
+    assert compressor.cache.hits == 1
+
+
+def test_shared_cache():
+    cache = MemoryCache()
+    first = CachedCompressor("deflate", cache)
+    second = CachedCompressor("deflate", cache)
+    other = CachedCompressor("lz77", cache)
+    first.data = TEXT
+    second.data = TEXT
+    other.data = TEXT
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert second.data == other.data == TEXT
+    assert cache.size < len(TEXT)
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        CachedCompressor("zip")
+
+
+def test_tampered_sqlite_file(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SQLiteCache(path)
+    compressor = CachedCompressor("deflate", cache)
+    compressor.data = TEXT
+    cache.close()
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE cache SET value = ?", (b"\x80\x04cos\nsystem",))
+    compressor = CachedCompressor("deflate", SQLiteCache(path))
+    compressor.data = TEXT
+    with pytest.raises(ValueError):
+        compressor.data
+    compressor.cache.close()
@@ -0,0 +1,48 @@
+"""
+Tests for the dedup module
+"""
+import random
+
+import pytest
+
+from dedup import DedupCompressor, DedupDecoder, DedupEncoder
+from deflate import DeflateCompressor
+
+
+def _random_bytes(seed: int, size: int) -> bytes:
+    """Incompressible data"""
+    return random.Random(seed).randbytes(size)
+
+
+def test_chunk_bounds():
+    data = _random_bytes(0, 100_000)
+    encoder = DedupEncoder(256, 1024, 4096)
+    bounds = encoder.chunk_bounds(data)
+    assert bounds[-1] == len(data)
+    sizes = [end - start for start, end in zip([0] + bounds, bounds)]
+    assert all(256 <= size <= 4096 for size in sizes[:-1])
+
+
+def test_repeats_are_stored_once():
+    record = _random_bytes(1, 5000)
+    data = record + _random_bytes(2, 20_000) + record + record
+    encoder = DedupEncoder(256, 1024, 4096)
+    encoded = encoder.encode(data)
+    assert len(encoded[0]) < len(data) - len(record)
+    assert DedupDecoder.decode(encoded) == data
+
+
+@pytest.mark.parametrize(
+    "data", [b"", "", b"abc", "text " * 1000, _random_bytes(3, 3000) * 3]
+)
+def test_round_trip(data):
+    compressor = DedupCompressor(min_size=64, avg_size=256, max_size=1024)
+    compressor.data = data
+    assert compressor.data == data
+
+
+def test_round_trip_over_deflate():
+    data = "the same old record\n" * 200
+    compressor = DedupCompressor(DeflateCompressor(), 64, 256, 1024)
+    compressor.data = data
+    assert compressor.data == data
@@ -0,0 +1,113 @@
+"""
+Tests for the serialization module
+"""
+import random
+
+import pytest
+
+from serialization import (
+    CODECS,
+    MAX_ALPHABET,
+    MAX_TABLE_LOG,
+    compress,
+    decompress,
+    varint,
+)
+
+TEXT = b"the quick brown fox jumps over the lazy dog, " * 20
+TEXT += bytes(range(256))
+
+
+def _tag(codec: str) -> bytes:
+    """The tag byte of the codec"""
+    return bytes([CODECS.index(codec)])
+
+
+@pytest.mark.parametrize("codec", CODECS)
+@pytest.mark.parametrize("data", [b"", b"a", b"abababababab", TEXT])
+def test_round_trip(codec, data):
+    assert decompress(compress(codec, data)) == data
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        compress("zip", b"data")
+
+
+@pytest.mark.parametrize(
+    "blob",
+    [
+        b"",
+        bytes([len(CODECS)]),
+        # Truncated varints
+        _tag("lz77") + b"\x80",
+        _tag("lzw") + b"\x02\x41\xff",
+        # A varint over 64 bits
+        _tag("lz77") + b"\xff" * 10 + b"\x01",
+        # More tokens than there are bytes left
+        _tag("lz77") + varint(100) + b"\x41",
+        # A match with a zero distance
+        _tag("lz77") + varint(1) + varint(258) + varint(0),
+        # Trailing data
+        _tag("lz77") + varint(1) + b"\x41\x41",
+        # The first LZW code must be a byte
+        _tag("lzw") + varint(1) + varint(300),
+        # Over-limit alphabets
+        _tag("huffmann") + varint(MAX_ALPHABET + 1),
+        _tag("deflate-tans") + varint(MAX_ALPHABET + 1),
+        # A tANS frequency over the largest table
+        _tag("deflate-tans") + varint(1) + b"\x41"
+        + varint((1 << MAX_TABLE_LOG) + 1),
+        # A repeated Huffmann code
+        _tag("huffmann") + varint(2) + b"\x41\x01\x00" + b"\x42\x01\x00",
+        # A bit string longer than its length
+        _tag("huffmann") + varint(1) + b"\x41\x01\x03" + varint(0),
+    ],
+)
+def test_malformed(blob):
+    with pytest.raises(ValueError):
+        decompress(blob)
+
+
+def test_bad_tans_frequency_sum():
+    # 3 is not a power of 2
+    code = (1).to_bytes(4, "little") + b"\x00\x00"
+    blob = (
+        _tag("deflate-tans") + varint(1) + b"\x41" + varint(3)
+        + varint(len(code)) + code
+    )
+    with pytest.raises(ValueError, match="power of 2"):
+        decompress(blob)
+
+
+def test_bits_that_match_no_huffmann_code():
+    # "A" is "0" and "B" is "10", so "11" is nothing
+    blob = (
+        _tag("huffmann") + varint(2)
+        + b"\x41" + varint(1) + b"\x00"
+        + b"\x42" + varint(2) + b"\x02"
+        + varint(1) + varint(2) + b"\x03"
+    )
+    with pytest.raises(ValueError, match="no Huffmann code"):
+        decompress(blob)
+
+
+def test_max_output():
+    blob = compress("deflate", b"a" * 1000)
+    assert decompress(blob, 1000) == b"a" * 1000
+    with pytest.raises(ValueError):
+        decompress(blob, 999)
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_fuzz(codec):
+    rng = random.Random(codec)
+    blob = bytearray(compress(codec, TEXT[:300]))
+    for _ in range(200):
+        broken = bytearray(blob)
+        for _ in range(rng.randint(1, 4)):
+            broken[rng.randrange(1, len(broken))] = rng.randrange(256)
+        try:
+            decompress(bytes(broken[: rng.randint(1, len(broken))]))
+        except ValueError:
+            pass
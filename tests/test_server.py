@@ -0,0 +1,169 @@
+"""
+Tests for the server module, against a real forked server
+"""
+import os
+import pickle
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import ROOT
+from server import (
+    CODECS,
+    MAX_PAYLOAD,
+    OP_COMPRESS,
+    OP_DECOMPRESS,
+    REQUEST,
+    ClientPool,
+    CompressionClient,
+    ServerError,
+    benchmark,
+)
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(os, "fork") or not hasattr(socket, "AF_UNIX"),
+    reason="the server needs os.fork and unix sockets",
+)
+
+DATA = b"the quick brown fox jumps over the lazy dog " * 10
+
+
+class _Exploit:
+    """Runs a command when unpickled"""
+
+    def __reduce__(self):
+        return (os.system, ("touch pwned",))
+
+
+@pytest.fixture
+def serve(tmp_path):
+    """Start a server with the given options and get its address"""
+    servers = []
+
+    def start(*args: str) -> str:
+        address = str(tmp_path / f"server{len(servers)}.sock")
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                os.path.join(ROOT, "src", "coding", "server.py"),
+                "serve",
+                "--unix",
+                address,
+                *args,
+            ],
+            cwd=tmp_path,
+            stderr=subprocess.PIPE,
+        )
+        servers.append(server)
+        for _ in range(100):
+            if os.path.exists(address):
+                return address
+            time.sleep(0.05)
+        raise RuntimeError("The server didn't start")
+
+    yield start
+    for server in servers:
+        server.terminate()
+        _, errors = server.communicate(timeout=10)
+        # Clients that go away must not print tracebacks in the workers
+        assert b"Traceback" not in errors, errors.decode()
+    assert not os.path.exists(tmp_path / "pwned")
+
+
+def test_round_trip(serve):
+    pool = ClientPool(serve("--workers", "2"))
+    for codec in CODECS:
+        for data in [b"", b"x", DATA]:
+            assert pool.decompress(pool.compress(data, codec)) == data
+    pool.close()
+
+
+def test_bad_payloads(serve):
+    pool = ClientPool(serve("--workers", "1"), 1)
+    for blob in [pickle.dumps(_Exploit()), b"", b"\x09", b"\x00\x05\x01"]:
+        with pytest.raises(ServerError):
+            pool.decompress(blob)
+    assert pool.decompress(pool.compress(DATA)) == DATA
+    pool.close()
+
+
+def test_pipeline(serve):
+    with CompressionClient(serve("--workers", "1")) as client:
+        requests = [(OP_COMPRESS, codec, DATA) for codec in CODECS] * 4
+        blobs = client.pipeline(requests, window=3)
+        assert client.pipeline(
+            [(OP_DECOMPRESS, CODECS[0], blob) for blob in blobs]
+        ) == [DATA] * len(blobs)
+
+
+def test_pipeline_error_keeps_the_connection_in_sync(serve):
+    pool = ClientPool(serve("--workers", "1"), 1)
+    good = pool.compress(DATA)
+    with pytest.raises(ServerError):
+        with pool.connection() as client:
+            client.pipeline(
+                [
+                    (OP_DECOMPRESS, CODECS[0], good),
+                    (OP_DECOMPRESS, CODECS[0], b"\x09bad"),
+                    (OP_DECOMPRESS, CODECS[0], good),
+                    (OP_DECOMPRESS, CODECS[0], good),
+                ]
+            )
+    assert not client.closed
+    assert pool.compress(b"xyz", "lz77") == client.compress(b"xyz", "lz77")
+    pool.close()
+
+
+def test_mismatched_response_closes_the_client(serve):
+    client = CompressionClient(serve("--workers", "1"))
+    request_id = client._send(OP_COMPRESS, "lz77", DATA)
+    with pytest.raises(ConnectionError):
+        client._receive(request_id + 1)
+    assert client.closed
+
+
+def test_oversized_payload_closes_the_connection(serve):
+    pool = ClientPool(serve("--workers", "1"), 1)
+    with pytest.raises(ServerError, match="too large"):
+        with pool.connection() as client:
+            client._socket.sendall(
+                REQUEST.pack(7, OP_COMPRESS, 0, MAX_PAYLOAD + 1)
+            )
+            client._receive(7)
+    assert client.closed
+    assert pool.decompress(pool.compress(DATA)) == DATA
+    pool.close()
+
+
+def test_idle_timeout(serve):
+    address = serve("--workers", "1", "--timeout", "0.2")
+    with CompressionClient(address) as client:
+        time.sleep(0.5)
+        with pytest.raises(OSError):
+            client.compress(DATA)
+        assert client.closed
+    with CompressionClient(address) as client:
+        assert client.compress(b"abc", "lz77")
+
+
+def test_max_connections(serve):
+    address = serve("--workers", "1", "--max-connections", "1")
+    first = CompressionClient(address)
+    assert first.compress(b"abc", "lz77")
+    # The only slot is taken, so this one waits in the backlog
+    second = CompressionClient(address)
+    second._socket.settimeout(0.3)
+    with pytest.raises(OSError):
+        second.compress(DATA)
+    first.close()
+    with CompressionClient(address) as third:
+        assert third.compress(b"abc", "lz77")
+
+
+def test_benchmark(serve):
+    stats = benchmark(serve("--workers", "2"), DATA, "lz77", 2, 5)
+    assert stats["p50_ms"] <= stats["p99_ms"]
+    assert stats["requests_per_s"] > 0
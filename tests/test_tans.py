@@ -0,0 +1,98 @@
+"""
+Tests for the tans module and the deflate backends
+"""
+import os
+from collections import Counter
+
+import pytest
+
+from deflate import DeflateCompressor
+from huffmann import HuffmannEncoder
+from lz77 import LZ77Encoder
+from tans import MAX_TABLE_LOG, TANSCompressor, TANSDecoder, TANSEncoder
+
+CORPUS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "introductiontoalgoritms.txt",
+)
+
+
+@pytest.mark.parametrize(
+    "stream",
+    [[], [1], [1] * 100, list(b"abracadabra"), list(range(1000)) * 2],
+)
+def test_round_trip(stream):
+    encoder = TANSEncoder()
+    code = encoder.encode(stream)
+    assert TANSDecoder().decode(code, encoder.alphabet) == stream
+
+
+def test_compressor():
+    compressor = TANSCompressor()
+    compressor.data = "mississippi"
+    assert "".join(compressor.data) == "mississippi"
+
+
+def test_shared_alphabet():
+    alphabet = TANSEncoder.normalise(Counter("abcabcabd"), 11)
+    encoder = TANSEncoder()
+    decoder = TANSDecoder()
+    for stream in ["abc", "dddd", "cab"]:
+        code = encoder.encode(stream, alphabet)
+        assert "".join(decoder.decode(code, alphabet)) == stream
+
+
+@pytest.mark.parametrize("table_log", [5, 11, 13])
+def test_normalise(table_log):
+    counter = Counter({symbol: symbol * symbol + 1 for symbol in range(30)})
+    alphabet = TANSEncoder.normalise(counter, table_log)
+    assert sum(alphabet.values()) == 1 << table_log
+    assert min(alphabet.values()) >= 1
+
+
+def test_choose_table_log():
+    assert TANSEncoder.choose_table_log(2) == 11
+    assert TANSEncoder.choose_table_log(662) == 13
+    assert TANSEncoder.choose_table_log(1 << 19) == MAX_TABLE_LOG
+    with pytest.raises(ValueError):
+        TANSEncoder.choose_table_log((1 << MAX_TABLE_LOG) + 1)
+
+
+def test_beats_huffmann_on_lz77_tokens():
+    with open(CORPUS, encoding="utf-8") as inp:
+        tokens = LZ77Encoder().encode(inp.read(20000))
+    huffmann = HuffmannEncoder().encode(tokens)
+    huffmann_bits = sum(
+        zeros + value.bit_length() for zeros, value in huffmann
+    )
+    assert len(TANSEncoder().encode(tokens)) < huffmann_bits / 8
+
+
+@pytest.mark.parametrize("backend", ["huffmann", "tans"])
+@pytest.mark.parametrize("data", ["", "a", "abcabcabcabcabc", "to be or not"])
+def test_deflate_round_trip(backend, data):
+    compressor = DeflateCompressor(backend=backend)
+    compressor.data = data
+    assert "".join(compressor.data) == data
+
+
+def test_deflate_unknown_backend():
+    with pytest.raises(ValueError):
+        DeflateCompressor(backend="zip")
+
+
+def test_tables_follow_the_alphabet():
+    alphabet = TANSEncoder.normalise(Counter("aaabbc"), 11)
+    reordered = dict(reversed(alphabet.items()))
+    other = TANSEncoder.normalise(Counter("xyz"), 11)
+    encoder = TANSEncoder()
+    decoder = TANSDecoder()
+    for stream, shared in [
+        ("abc", alphabet),
+        ("cab", reordered),
+        ("zyx", other),
+        ("bca", alphabet),
+    ]:
+        code = encoder.encode(stream, shared)
+        assert "".join(decoder.decode(code, shared)) == stream
+        assert "".join(TANSDecoder().decode(code, dict(shared))) == stream